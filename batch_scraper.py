@@ -0,0 +1,330 @@
+import argparse
+import csv
+import json
+import re
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+from html_backends import PARSER_BACKENDS
+from scraper import (WORDPRESS_API, AdaptiveThrottle, HostThrottle, Throttled, WebsiteScraper,
+                     make_session)
+
+# Crawl many sites at once. Every site gets its own WebsiteScraper (frontier,
+# checkpoint, output) but they share one connection pool, one per-host
+# throttle and one global pool of worker threads. Sites are served
+# round-robin and each may only hold per_site workers, and only while its
+# host is ready for another request, so one slow or rate-limited site can't
+# tie up the threads the others need.
+
+DEFAULT_SITES_FILE = 'Client List  - Clients According to the Industry .csv'
+
+DOMAIN_PATTERN = re.compile(r'^(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z]{2,}(?::\d+)?(?:/\S*)?$',
+                            re.IGNORECASE)
+
+# A site's worker may wait this long for its host's next slot; a host that
+# is paused or rate-limited for longer is skipped until it is ready
+HOST_WAIT_SLACK = 1.0
+
+def as_site_url(cell):
+    """A start URL for a cell that is a URL or a bare domain, else None"""
+    cell = cell.strip()
+    if re.match(r'^https?://', cell, re.IGNORECASE):
+        return cell if urlparse(cell).netloc else None
+    if DOMAIN_PATTERN.match(cell):
+        return f"https://{cell}"
+    return None
+
+def read_sites(path):
+    """(start URLs, skipped cells) from a CSV or plain list, one site per URL/domain cell"""
+    urls = []
+    skipped = []
+    seen = set()
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.reader(f):
+            for cell in row:
+                if not cell.strip():
+                    continue
+                url = as_site_url(cell)
+                if url is None:
+                    skipped.append(cell.strip())
+                elif urlparse(url).netloc.lower() not in seen:
+                    seen.add(urlparse(url).netloc.lower())
+                    urls.append(url)
+    return urls, skipped
+
+def shard_name(url):
+    """Directory name for a site's output"""
+    return re.sub(r'[^a-zA-Z0-9.-]', '_', urlparse(url).netloc.lower())
+
+class SiteCrawl:
+    """One site of the batch: its scraper plus scheduling state"""
+    def __init__(self, url):
+        self.url = url
+        self.scraper = None
+        self.in_flight = 0
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.timed_out = False
+
+class BatchCrawler:
+    def __init__(self, urls, output_dir='scraped-content/sites', max_workers=16, per_site=2,
+                 min_delay=1.0, adaptive=True, max_rate=10.0, max_active_sites=None,
+                 site_timeout=None, max_pages=None, max_depth=None, parser_backend='lxml',
+                 cache_dir=None, resume=False):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max(1, max_workers)
+        self.per_site = max(1, per_site)
+        self.max_active_sites = max_active_sites or self.max_workers
+        self.site_timeout = site_timeout
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.parser_backend = parser_backend
+        self.cache_dir = cache_dir
+        self.resume = resume
+        # One pool per host, each big enough for the site's own workers
+        self.session = make_session(pool_connections=self.max_active_sites,
+                                    pool_maxsize=self.per_site)
+        if adaptive:
+            self.throttle = AdaptiveThrottle(max_per_host=self.per_site, min_delay=min_delay,
+                                             max_rate=max_rate)
+        else:
+            self.throttle = HostThrottle(max_per_host=self.per_site, min_delay=min_delay)
+        self.waiting = deque(SiteCrawl(url) for url in urls)
+        self.active = []
+        self.results = []
+
+    def resolve(self, url):
+        """Follow redirects from the start URL so links on the real host count as internal"""
+        try:
+            with self.throttle.limit(url):
+                response = self.session.head(url, timeout=15, allow_redirects=True)
+            return response.url
+        except requests.RequestException:
+            return url
+
+    def start_site(self, site):
+        """Build the site's scraper and read its robots.txt and sitemaps (in a worker)"""
+        site.started = time.monotonic()
+        url = self.resolve(site.url)
+        shard = self.output_dir / shard_name(url)
+        shard.mkdir(parents=True, exist_ok=True)
+        options = dict(max_workers=self.per_site, max_per_host=self.per_site,
+                       cache_dir=self.cache_dir, checkpoint_path=str(shard / 'crawl.sqlite3'),
+                       output_path=str(shard / 'all_pages.jsonl'), keep_pages=False,
+                       parser_backend=self.parser_backend,
+                       metrics_path=str(shard / 'crawl_metrics.json'),
+                       max_depth=self.max_depth, max_pages=self.max_pages,
+                       session=self.session, throttle=self.throttle)
+        try:
+            scraper = WebsiteScraper(url, resume=self.resume, **options)
+        except ValueError:
+            # Nothing saved for this site yet: start it fresh
+            scraper = WebsiteScraper(url, **options)
+        scraper.prepare_crawl()
+        return scraper
+
+    def out_of_time(self, site):
+        if self.site_timeout is None or site.started is None:
+            return False
+        if time.monotonic() - site.started > self.site_timeout:
+            site.timed_out = True
+        return site.timed_out
+
+    def schedule(self, pool, in_flight):
+        """Hand out URLs round-robin to sites with a free slot and a ready host.
+
+        Returns the seconds until a skipped host is ready, or None."""
+        soonest = None
+        progressed = True
+        while progressed and len(in_flight) < self.max_workers:
+            progressed = False
+            for site in self.active:
+                if len(in_flight) >= self.max_workers:
+                    break
+                scraper = site.scraper
+                if (scraper is None or site.in_flight >= self.per_site or
+                        self.out_of_time(site) or not (scraper.frontier or scraper.wordpress_home)):
+                    continue
+                delay = self.throttle.ready_in(scraper.base_url)
+                if delay > HOST_WAIT_SLACK:
+                    soonest = delay - HOST_WAIT_SLACK if soonest is None else \
+                        min(soonest, delay - HOST_WAIT_SLACK)
+                    continue
+                # The REST API pass runs on the pool like a fetch, so a long
+                # WordPress site doesn't hold up the scheduler
+                wordpress_job = scraper.start_wordpress_api(pool)
+                if wordpress_job:
+                    in_flight[wordpress_job] = (site, WORDPRESS_API)
+                else:
+                    url = scraper.next_url()
+                    if url is None:
+                        continue
+                    in_flight[pool.submit(scraper.scrape_page, url)] = (site, url)
+                site.in_flight += 1
+                progressed = True
+        return soonest
+
+    def site_done(self, site):
+        if site.in_flight:
+            return False
+        if site.error:
+            return True
+        scraper = site.scraper
+        return scraper is not None and (not (scraper.frontier or scraper.wordpress_home) or
+                                        self.out_of_time(site))
+
+    def finish_site(self, site):
+        self.active.remove(site)
+        site.finished = time.monotonic()
+        elapsed = site.finished - (site.started or site.finished)
+        result = {'url': site.url, 'pages': 0, 'fetched': 0, 'seconds': round(elapsed, 2),
+                  'error': site.error, 'timed_out': site.timed_out}
+        scraper = site.scraper
+        if scraper is not None:
+            if scraper.output:
+                scraper.output.close()
+            if scraper.metrics_path:
+                scraper.metrics.write_json(scraper.metrics_path)
+            scraper.metrics.close()
+            if scraper.checkpoint:
+                scraper.checkpoint.close()
+            result.update(url=scraper.base_url, pages=scraper.pages_found,
+                          fetched=scraper.fetched, shard=str(self.output_dir / shard_name(scraper.base_url)))
+        self.results.append(result)
+
+        note = f" (error: {site.error})" if site.error else ""
+        if site.timed_out:
+            note = " (time limit reached; run again with --resume to continue)"
+        print(f"Finished {result['url']}: {result['pages']} pages, {result['fetched']} URLs "
+              f"in {elapsed:.1f}s{note}")
+
+    def run(self):
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            in_flight = {}  # future -> (site, url); url is None while the site starts
+            # and WORDPRESS_API for its REST API pass
+            while self.waiting or self.active:
+                while self.waiting and len(self.active) < self.max_active_sites:
+                    site = self.waiting.popleft()
+                    self.active.append(site)
+                    in_flight[pool.submit(self.start_site, site)] = (site, None)
+                    site.in_flight += 1
+
+                soonest = self.schedule(pool, in_flight)
+                for site in [site for site in self.active if self.site_done(site)]:
+                    self.finish_site(site)
+
+                if not in_flight:
+                    if soonest is not None:
+                        time.sleep(soonest)
+                    continue
+
+                done, _ = wait(in_flight, timeout=soonest, return_when=FIRST_COMPLETED)
+                for future in done:
+                    site, url = in_flight.pop(future)
+                    site.in_flight -= 1
+                    if url is None:
+                        try:
+                            site.scraper = future.result()
+                        except Exception as e:
+                            site.error = str(e)
+                            print(f"Could not start {site.url}: {site.error}")
+                        continue
+                    if url == WORDPRESS_API:
+                        site.scraper.store_wordpress_pages(*future.result())
+                        continue
+                    try:
+                        page_data = future.result()
+                    except Throttled:
+                        site.scraper.requeue(url)
+                        continue
+                    site.scraper.fetched += 1
+                    site.scraper.store_page(url, page_data)
+        return time.monotonic() - started
+
+    def summary(self, elapsed):
+        pages = sum(result['pages'] for result in self.results)
+        fetched = sum(result['fetched'] for result in self.results)
+        rate = fetched / elapsed if elapsed else 0.0
+        lines = [f"{'site':<45}{'pages':>7}{'URLs':>7}{'time':>9}  note"]
+        for result in sorted(self.results, key=lambda result: result['url']):
+            note = 'error' if result['error'] else 'time limit' if result['timed_out'] else ''
+            lines.append(f"{result['url'][:44]:<45}{result['pages']:>7}{result['fetched']:>7}"
+                         f"{result['seconds']:>8.1f}s  {note}")
+        lines.append(f"Batch complete: {len(self.results)} sites, {pages} pages, {fetched} URLs "
+                     f"in {elapsed:.1f}s ({rate:.2f} pages/sec)")
+        return '\n'.join(lines)
+
+    def write_summary(self, elapsed):
+        path = self.output_dir / 'batch_summary.json'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'seconds': round(elapsed, 2), 'sites': self.results}, f, indent=2)
+        return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl many sites at once, one output shard per site")
+    parser.add_argument('urls', nargs='*', help="sites to crawl (default: read --sites-file)")
+    parser.add_argument('--sites-file', default=None,
+                        help=f"CSV or text file; every cell that is a URL or domain is a site "
+                             f"(default when no URLs are given: {DEFAULT_SITES_FILE!r})")
+    parser.add_argument('--output-dir', default='scraped-content/sites',
+                        help="each site is written to its own directory under here")
+    parser.add_argument('--workers', type=int, default=16,
+                        help="pages fetched in parallel across all sites")
+    parser.add_argument('--per-site', type=int, default=2,
+                        help="maximum concurrent requests to one site")
+    parser.add_argument('--max-sites', type=int, default=None,
+                        help="sites crawled at the same time (default: --workers)")
+    parser.add_argument('--delay', type=float, default=1.0,
+                        help="minimum seconds between requests to one host")
+    parser.add_argument('--max-rate', type=float, default=10.0,
+                        help="ceiling for the adaptive per-host request rate (requests/sec)")
+    parser.add_argument('--fixed-rate', action='store_true',
+                        help="space requests by --delay only, without adapting to the server")
+    parser.add_argument('--site-timeout', type=float, default=None,
+                        help="stop scheduling a site after this many seconds")
+    parser.add_argument('--max-pages', type=int, default=None, help="URLs fetched per site at most")
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help="ignore links more than this many hops from a site's start page")
+    parser.add_argument('--parser', choices=PARSER_BACKENDS, default='lxml')
+    parser.add_argument('--cache-dir', default='scraped-content/cache',
+                        help="where to keep pages for conditional re-crawls")
+    parser.add_argument('--no-cache', action='store_true', help="always download pages in full")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue each site from its saved checkpoint")
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    sites_file = args.sites_file or (None if urls else DEFAULT_SITES_FILE)
+    if sites_file:
+        found, skipped = read_sites(sites_file)
+        urls.extend(url for url in found if url not in urls)
+        print(f"{sites_file}: {len(found)} sites")
+        if skipped:
+            examples = ', '.join(repr(cell) for cell in skipped[:3])
+            print(f"Skipped {len(skipped)} cells that are not URLs or domains ({examples}, ...); "
+                  f"add the site addresses to the file to include them")
+    if not urls:
+        parser.exit(1, "No sites to crawl.\n")
+
+    batch = BatchCrawler(urls, output_dir=args.output_dir, max_workers=args.workers,
+                         per_site=args.per_site, min_delay=args.delay,
+                         adaptive=not args.fixed_rate, max_rate=args.max_rate,
+                         max_active_sites=args.max_sites, site_timeout=args.site_timeout,
+                         max_pages=args.max_pages, max_depth=args.max_depth,
+                         parser_backend=args.parser,
+                         cache_dir=None if args.no_cache else args.cache_dir,
+                         resume=args.resume)
+    print(f"Crawling {len(urls)} sites with {batch.max_workers} workers, "
+          f"{batch.per_site} per site, {batch.max_active_sites} sites at a time")
+    elapsed = batch.run()
+    print(batch.summary(elapsed))
+    print(batch.throttle.summary())
+    print(f"Batch summary saved to {batch.write_summary(elapsed)}")
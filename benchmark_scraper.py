@@ -0,0 +1,787 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.request import urlopen
+from bs4 import BeautifulSoup
+from requests.utils import get_encoding_from_headers
+import fingerprints
+from fingerprints import DEFAULT_RULES_FILE, Fingerprinter
+from html_backends import available_backends, parse_html
+from charsets import decode_html
+from distributed_crawl import run_local
+import image_variants
+from scraper import WebsiteScraper, build_response
+from shared_frontier import connect, crawl_status, start_crawl
+from url_sets import VISITED_SET_KINDS, make_visited_set
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Benchmarks for scraper.py that run entirely offline against generated HTML
+# (and, for `site`, a generated site served from localhost).
+
+LOREM = ("event planning corporate offsite team building gala dinner conference "
+         "venue logistics stage design audio visual hospitality experience").split()
+
+def lorem(rng, words):
+    return ' '.join(rng.choice(LOREM) for _ in range(words)).capitalize() + '.'
+
+def make_section_html(rng, depth, paragraphs, images):
+    """One <section> with text, spans, lists, images and nested sub-sections"""
+    parts = [f"<h2>{lorem(rng, 4)}</h2>"]
+    for _ in range(paragraphs):
+        parts.append(f"<p>{lorem(rng, 12)} <span>{lorem(rng, 8)}</span> {lorem(rng, 6)}</p>")
+    parts.append("<ul>" + ''.join(f"<li>{lorem(rng, 7)}</li>" for _ in range(3)) + "</ul>")
+    for i in range(images):
+        parts.append(f'<img src="/assets/images/{rng.randrange(10**6)}.jpg" alt="{lorem(rng, 3)}">')
+    if rng.random() < 0.2:
+        parts.append('<iframe src="https://www.youtube.com/embed/dQw4w9WgXcQ"></iframe>')
+    if depth > 1:
+        parts.append('<div class="container">')
+        for _ in range(2):
+            parts.append(f"<div>{make_section_html(rng, depth - 1, paragraphs // 2, images // 2)}</div>")
+        parts.append('</div>')
+    return f"<section>{''.join(parts)}</section>"
+
+def make_page_html(sections=40, depth=3, paragraphs=6, images=3, links=(), seed=0, title="Fixture"):
+    """A large, deeply nested page in the shape of a typical marketing site"""
+    rng = random.Random(seed)
+    nav = ''.join(f'<a href="{href}">{lorem(rng, 1)}</a>' for href in links[:8])
+    body_links = ''.join(f'<a href="{href}">{lorem(rng, 2)}</a>' for href in links)
+    body = ''.join(make_section_html(rng, depth, paragraphs, images) for _ in range(sections))
+    return (f"<!DOCTYPE html><html><head><title>{title}</title>"
+            f'<meta name="description" content="{lorem(rng, 10)}"></head><body>'
+            f'<header class="site-header"><nav>{nav}</nav></header>'
+            f'<main><div class="content-section">{body}</div></main>'
+            f'<div class="links">{body_links}</div>'
+            f'<footer class="footer"><p>{lorem(rng, 10)}</p></footer></body></html>')
+
+# Hand-written page covering the awkward cases: comments and scripts inside
+# text, entities, valueless attributes, skipped nav/footer classes, the
+# main > div and .container > div patterns, and videos.
+EDGE_CASE_HTML = """<!DOCTYPE html>
+<html><head><title>  Edge &amp; Cases  </title>
+<meta name="description" content="Edge case fixture">
+<meta name="generator" content="WordPress 6.4">
+<link rel="stylesheet" href="/wp-content/themes/site/style.css">
+<script src="/wp-includes/js/jquery.js"></script></head>
+<body>
+<header class="site-header"><nav><a href="/">Home</a><a href="/about/">About&nbsp;us</a></nav></header>
+<main>
+  <div><h1>Welcome to the fixture page</h1>
+    <p>Text with a <!-- comment --> comment and <script>var hidden = 1;</script>a script inside it.</p>
+    <p>Short</p>
+  </div>
+  <div class="navbar-wrapper"><p>This paragraph sits in a skipped navbar wrapper.</p></div>
+</main>
+<div class="container">
+  <div><h3>Container child</h3><ul><li>List item that is long enough to keep <span>with a nested span inside</span></li></ul>
+    <img src="/a.jpg" alt><img src="" alt="no source"><img src="/b.png" title="B title" alt="B">
+  </div>
+</div>
+<section class="section"><h2>Videos &amp; embeds</h2>
+  <video src="/clip.mp4" controls></video><iframe src="https://player.vimeo.com/video/1"></iframe>
+  <article><h4>Nested article heading</h4><p>An article nested inside a section keeps its own text.</p>
+    <div class="section"><p>A div.section nested in an article, three levels down.</p></div>
+  </article>
+</section>
+<div class="content-section"><p> Non-breaking space padded paragraph text goes here. </p></div>
+<footer class="footer"><section><p>Footer section paragraph that is long enough.</p></section></footer>
+</body></html>"""
+
+def page_fields(scraper, html):
+    """Everything parse_page extracts, minus the timestamp"""
+    response = SimpleNamespace(content=html.encode("utf-8"), headers={})
+    page_data, new_urls = scraper.parse_page('http://fixture.local/page', response)
+    page_data.pop('scraped_at')
+    page_data['discovered_urls'] = sorted(new_urls)
+    return page_data
+
+def legacy_extract_sections(soup):
+    """extract_sections as it was before the single-pass walk, for comparison"""
+    sections = []
+    section_index = 1
+    section_selectors = [
+        'section', 'div.section', '.content-section',
+        'article', 'main > div', '.container > div'
+    ]
+    for selector in section_selectors:
+        for element in soup.select(selector):
+            if any(cls in str(element.get('class', [])).lower() for cls in ['nav', 'footer', 'header']):
+                continue
+            section_data = {'index': section_index, 'title': None, 'content': [],
+                            'images': [], 'videos': []}
+            heading = element.find(['h1', 'h2', 'h3', 'h4'])
+            if heading:
+                section_data['title'] = heading.get_text(strip=True)
+            for p in element.find_all(['p', 'li', 'span']):
+                text = p.get_text(strip=True)
+                if text and len(text) > 20:
+                    section_data['content'].append(text)
+            for img in element.find_all('img'):
+                img_data = {'src': img.get('src', ''), 'alt': img.get('alt', ''),
+                            'title': img.get('title', '')}
+                if img_data['src']:
+                    section_data['images'].append(img_data)
+            for video in element.find_all(['video', 'iframe']):
+                video_data = {'src': video.get('src', ''),
+                              'type': 'video' if video.name == 'video' else 'iframe'}
+                if video_data['src']:
+                    section_data['videos'].append(video_data)
+            if section_data['content'] or section_data['images'] or section_data['videos']:
+                sections.append(section_data)
+                section_index += 1
+    return sections
+
+def time_best(func, repeat):
+    """Best-of-N wall time and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def describe_sections(sections):
+    return {
+        'sections': len(sections),
+        'paragraphs': sum(len(s['content']) for s in sections),
+        'images': sum(len(s['images']) for s in sections),
+        'videos': sum(len(s['videos']) for s in sections),
+        'json_kb': len(json.dumps(sections)) / 1024,
+    }
+
+def bench_sections(args):
+    html = make_page_html(sections=args.sections, depth=args.depth, seed=args.seed)
+    soup = BeautifulSoup(html, 'html.parser')
+    scraper = WebsiteScraper('http://fixture.local/')
+    print(f"Fixture page: {len(html) / 1024:.0f} KB, {len(soup.find_all(True))} elements")
+
+    rows = []
+    for name, func in (('legacy (6 selectors)', lambda: legacy_extract_sections(soup)),
+                       ('single pass', lambda: scraper.extract_sections(soup))):
+        elapsed, sections = time_best(func, args.repeat)
+        rows.append((name, elapsed, describe_sections(sections)))
+
+    print(f"{'extractor':<22}{'time':>10}{'sections':>10}{'paras':>8}{'images':>8}{'videos':>8}{'JSON KB':>10}")
+    for name, elapsed, stats in rows:
+        print(f"{name:<22}{elapsed * 1000:>8.1f}ms{stats['sections']:>10}{stats['paragraphs']:>8}"
+              f"{stats['images']:>8}{stats['videos']:>8}{stats['json_kb']:>10.1f}")
+    legacy, single = rows[0], rows[1]
+    print(f"Speed-up: {legacy[1] / single[1]:.1f}x, output "
+          f"{single[2]['json_kb'] / legacy[2]['json_kb'] * 100:.0f}% of legacy size")
+
+def bench_parsers(args):
+    backends = available_backends()
+    fixtures = [('edge cases', EDGE_CASE_HTML)]
+    for seed in range(args.pages):
+        links = [f"/page-{seed}-{i}/" for i in range(20)]
+        fixtures.append((f"generated #{seed}", make_page_html(sections=args.sections, links=links,
+                                                             seed=seed, title=f"Page {seed}")))
+    print(f"Backends: {', '.join(backends)}; {len(fixtures)} fixture pages")
+
+    # Equivalence: every backend must produce exactly what html.parser does
+    reference = WebsiteScraper('http://fixture.local/', parser_backend='html.parser')
+    failures = 0
+    for name, html in fixtures:
+        expected = page_fields(reference, html)
+        for backend in backends[1:]:
+            scraper = WebsiteScraper('http://fixture.local/', parser_backend=backend)
+            actual = page_fields(scraper, html)
+            for key in expected:
+                if actual[key] != expected[key]:
+                    failures += 1
+                    print(f"MISMATCH {backend} on {name}: {key}")
+                    print(f"  html.parser: {json.dumps(expected[key])[:300]}")
+                    print(f"  {backend}: {json.dumps(actual[key])[:300]}")
+    if failures:
+        print(f"{failures} mismatches")
+        sys.exit(1)
+    print("All backends extract identical page data")
+
+    # Speed: parse alone, then parse + full page extraction
+    print(f"{'backend':<14}{'parse':>12}{'parse+extract':>16}")
+    for backend in backends:
+        scraper = WebsiteScraper('http://fixture.local/', parser_backend=backend)
+        parse_time, _ = time_best(lambda: [parse_html(html, backend) for _, html in fixtures],
+                                  args.repeat)
+        full_time, _ = time_best(lambda: [page_fields(scraper, html)
+                                          for _, html in fixtures], args.repeat)
+        print(f"{backend:<14}{parse_time * 1000:>10.1f}ms{full_time * 1000:>14.1f}ms")
+
+def synthetic_rules(count, seed=0):
+    """Plausible-looking extra signatures that never match the fixture"""
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        token = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(7))
+        rules.append({'name': f"Synthetic {i}", 'category': 'synthetic',
+                      'meta': {'generator': f"^{token}"},
+                      'headers': {f"x-{token}-id": ''},
+                      'urls': [f"/{token}/{token}.min.js", f"cdn.{token}.io"],
+                      'body': [f"{token}-widget", f"data-{token}="]})
+    return rules
+
+def naive_detect(rules, soup, headers, html):
+    """Check every rule in turn, the way detect_cms used to scale"""
+    found = []
+    lowered = html.lower()
+    asset_urls = [(tag.get('src') or tag.get('href') or '').lower()
+                  for tag in soup.find_all(['script', 'link'])]
+    for rule in rules:
+        if any(literal.lower() in lowered for literal in rule.get('body', [])) or \
+           any(literal.lower() in url for literal in rule.get('urls', []) for url in asset_urls):
+            found.append(rule['name'])
+    return found
+
+# Pages carrying another CMS's assets as well as their own: (name, headers, html, expected cms)
+WORDPRESS_HEAD = ('<meta name="generator" content="WordPress 6.4">'
+                  '<link rel="stylesheet" href="/wp-content/themes/site/style.css">')
+MIXED_CMS_PAGES = [
+    ('WordPress + Contentful image', {},
+     f'<html><head>{WORDPRESS_HEAD}</head><body>'
+     '<img src="https://images.ctfassets.net/abc/hero.jpg"></body></html>', 'WordPress'),
+    ('WordPress + HubSpot form', {},
+     f'<html><head>{WORDPRESS_HEAD}'
+     '<script src="https://123.fs1.hubspotusercontent-na1.net/hubfs/form.js"></script></head>'
+     '<body><img src="https://f.hubspotusercontent.net/x.png"></body></html>', 'WordPress'),
+    ('WordPress + Wix image', {},
+     f'<html><head>{WORDPRESS_HEAD}</head><body>'
+     '<img src="https://static.wixstatic.com/media/logo.png"></body></html>', 'WordPress'),
+    ('WordPress by header only', {'Link': '<https://site/wp-json/>; rel="https://api.w.org/"'},
+     '<html><body><img src="https://images.ctfassets.net/abc/hero.jpg"></body></html>', 'WordPress'),
+    ('Contentful only', {},
+     '<html><body><img src="https://images.ctfassets.net/abc/hero.jpg"></body></html>', 'Contentful'),
+]
+
+def check_mixed_cms(engine):
+    """Print the cms found for each mixed page; returns how many were wrong"""
+    wrong = 0
+    for name, headers, html, expected in MIXED_CMS_PAGES:
+        cms = engine.detect(BeautifulSoup(html, 'lxml'), headers, html)['cms']
+        wrong += cms != expected
+        print(f"  {name:<30}{str(cms):<14}{'ok' if cms == expected else 'WRONG, expected ' + expected}")
+    return wrong
+
+def check_engines_agree(rules, pages):
+    """Compare every literal matcher with a plain substring test, and the cms
+    each engine detects; returns how many results differ"""
+    literals = sorted({literal.lower() for rule in rules
+                       for literal in rule.get('urls', []) + rule.get('body', [])})
+    # Each literal on its own too: one that is a prefix of another must be
+    # found inside the longer one
+    texts = [html.lower() for _, _, html, *_ in pages] + [f"<{literal}>" for literal in literals]
+    installed = fingerprints.ahocorasick
+    engines = [('trie regex', None)] + ([('aho-corasick', installed)] if installed else [])
+    wrong = 0
+    detected = {}
+    for name, module in engines:
+        fingerprints.ahocorasick = module
+        matcher = fingerprints.LiteralMatcher(literals)
+        missed = 0
+        for text in texts:
+            expected = {literal for literal in literals if literal in text}
+            missed += len(expected ^ matcher.scan(text))
+        engine = Fingerprinter(rules)
+        detected[name] = [engine.detect(BeautifulSoup(html, 'lxml'), headers, html)
+                          for _, headers, html, *_ in pages]
+        print(f"  {name:<30}{missed} literals found or missed wrongly")
+        wrong += missed
+    fingerprints.ahocorasick = installed
+    if len(detected) > 1 and detected['trie regex'] != detected['aho-corasick']:
+        print("  trie regex and aho-corasick detect different technologies")
+        wrong += 1
+    return wrong
+
+def bench_fingerprints(args):
+    with open(DEFAULT_RULES_FILE, 'r', encoding='utf-8') as f:
+        base_rules = json.load(f)
+    print("CMS on pages with more than one CMS's signatures:")
+    if check_mixed_cms(Fingerprinter(base_rules)):
+        sys.exit(1)
+    print("Literal matchers against a plain substring test:")
+    if check_engines_agree(base_rules + synthetic_rules(200), MIXED_CMS_PAGES):
+        sys.exit(1)
+    html = make_page_html(sections=args.sections, seed=1) + EDGE_CASE_HTML
+    soup = BeautifulSoup(html, 'lxml')
+    headers = {'Server': 'nginx', 'X-Powered-By': 'PHP/8.2'}
+    print(f"Fixture page: {len(html) / 1024:.0f} KB; pyahocorasick "
+          f"{'installed' if fingerprints.ahocorasick else 'not installed'}")
+
+    installed = fingerprints.ahocorasick
+    engines = [('naive loop', None)]
+    if installed is not None:
+        engines.append(('aho-corasick', installed))
+    engines.append(('trie regex', None))
+
+    print(f"{'rules':>7}" + ''.join(f"{name:>16}" for name, _ in engines))
+    for extra in args.extra:
+        rules = base_rules + synthetic_rules(extra)
+        row = f"{len(rules):>7}"
+        for name, module in engines:
+            if name == 'naive loop':
+                elapsed, _ = time_best(lambda: naive_detect(rules, soup, headers, html), args.repeat)
+            else:
+                # Choose the literal matcher at compile time
+                fingerprints.ahocorasick = module
+                engine = Fingerprinter(rules)
+                elapsed, _ = time_best(lambda: engine.detect(soup, headers, html), args.repeat)
+            row += f"{elapsed * 1000:>14.2f}ms"
+        print(row)
+
+    fingerprints.ahocorasick = installed
+
+def crawl_urls(count, prefix='page'):
+    """Realistic-length URLs of a large client site"""
+    for i in range(count):
+        yield (f"https://www.example-client.com/{LOREM[i % len(LOREM)]}/"
+               f"{LOREM[i // 7 % len(LOREM)]}-{prefix}-{i}/")
+
+def bench_visited(args):
+    print(f"{'visited set':<12}{'URLs':>10}{'memory':>11}{'bytes/URL':>11}{'vs exact':>10}"
+          f"{'add':>10}{'lookup':>10}{'false +':>10}")
+    exact_bytes = None
+    for kind in args.kinds:
+        started = time.perf_counter()
+        urls = make_visited_set(kind, args.error_rate)
+        for url in crawl_urls(args.urls):
+            urls.add(url)
+        add_time = time.perf_counter() - started
+        # nbytes() sums sys.getsizeof over everything the set keeps alive,
+        # including the URL strings of the exact set
+        memory = urls.nbytes()
+
+        probes = list(crawl_urls(args.probes))
+        unseen = list(crawl_urls(args.probes, prefix='unseen'))
+        started = time.perf_counter()
+        missing = sum(1 for url in probes if url not in urls)
+        lookup_time = time.perf_counter() - started
+        false_positives = sum(1 for url in unseen if url in urls)
+        if missing:
+            print(f"{kind}: {missing} added URLs reported as unseen")
+            sys.exit(1)
+
+        if kind == 'exact':
+            exact_bytes = memory
+        ratio = f"{memory / exact_bytes * 100:.0f}%" if exact_bytes else '-'
+        print(f"{kind:<12}{len(urls):>10}{memory / 1024 / 1024:>9.1f}MB{memory / args.urls:>11.1f}"
+              f"{ratio:>10}{add_time / args.urls * 1e6:>8.2f}us"
+              f"{lookup_time / args.probes * 1e6:>8.2f}us"
+              f"{false_positives / args.probes * 100:>9.3f}%")
+        del urls
+
+ACCENTED = "Caf\u00e9 cr\u00e8me \u2013 \u201cna\u00efve\u201d pricing from \u20ac250 per guest"
+
+def charset_fixtures(sections):
+    """(name, headers, body bytes, expected text) for the ways sites declare a charset"""
+    def page(meta=''):
+        html = make_page_html(sections=sections, seed=2)
+        return html.replace('<head>', f"<head>{meta}", 1).replace('<body>', f"<body><p>{ACCENTED}</p>", 1)
+    utf8_meta = page('<meta charset="utf-8">')
+    cp1252_meta = page('<meta http-equiv="Content-Type" content="text/html; charset=windows-1252">')
+    plain = page()
+    return [
+        ('header utf-8', {'Content-Type': 'text/html; charset=utf-8'}, plain.encode('utf-8'), plain),
+        ('meta utf-8', {'Content-Type': 'text/html'}, utf8_meta.encode('utf-8'), utf8_meta),
+        ('meta windows-1252', {'Content-Type': 'text/html'}, cp1252_meta.encode('cp1252'), cp1252_meta),
+        ('BOM utf-8', {'Content-Type': 'text/html'}, b'\xef\xbb\xbf' + plain.encode('utf-8'), plain),
+        ('undeclared utf-8', {'Content-Type': 'text/html'}, plain.encode('utf-8'), plain),
+        ('undeclared cp1252', {'Content-Type': 'text/html'}, plain.encode('cp1252'), plain),
+        ('no content-type', {}, plain.encode('utf-8'), plain),
+    ]
+
+def legacy_decode(body, headers):
+    """What parse_page used to do: response.text for the parser, then again for detect_cms"""
+    response = build_response('http://fixture.local/', body, headers, get_encoding_from_headers(headers))
+    return response.text, response.text
+
+def bench_charset(args):
+    fixtures = charset_fixtures(args.sections)
+    print(f"Fixture pages: {len(fixtures[0][2]) / 1024:.0f} KB each")
+    print(f"{'page':<20}{'response.text x2':>18}{'ok':>5}{'decode_html':>14}{'ok':>5}{'source':>10}")
+    wrong = 0
+    for name, headers, body, expected in fixtures:
+        legacy_time, (legacy_text, _) = time_best(lambda: legacy_decode(body, headers), args.repeat)
+        new_time, (text, _, source) = time_best(lambda: decode_html(body, headers), args.repeat)
+        legacy_ok = legacy_text.lstrip('\ufeff') == expected
+        ok = text.lstrip('\ufeff') == expected
+        wrong += not ok
+        print(f"{name:<20}{legacy_time * 1000:>16.2f}ms{'yes' if legacy_ok else 'NO':>5}"
+              f"{new_time * 1000:>12.2f}ms{'yes' if ok else 'NO':>5}{source:>10}")
+    if wrong:
+        print(f"decode_html got {wrong} pages wrong")
+        sys.exit(1)
+
+def fixture_href(index):
+    return '/' if index == 0 else f"/page-{index}/"
+
+def build_fixture_site(pages=200, fanout=10, depth=3, images=3, page_kb=40, seed=0):
+    """Every path of a synthetic site -> (content type, body bytes).
+
+    Pages form a tree (page i links to pages i*fanout+1 .. i*fanout+fanout)
+    with a few random cross-links and a link home, so the crawler has to
+    deduplicate as well as discover."""
+    per_section = len(make_section_html(random.Random(seed), depth, 6, images))
+    sections = max(1, round(page_kb * 1024 / per_section))
+    site = {}
+    for index in range(pages):
+        rng = random.Random(seed + index)
+        children = [child for child in range(index * fanout + 1, index * fanout + fanout + 1)
+                    if child < pages]
+        cross_links = [rng.randrange(pages) for _ in range(max(1, fanout // 2))]
+        links = [fixture_href(i) for i in children + cross_links + [0]]
+        html = make_page_html(sections=sections, depth=depth, images=images, links=links,
+                              seed=seed + index, title=f"Fixture page {index}")
+        site[fixture_href(index).rstrip('/') or '/'] = ('text/html; charset=utf-8',
+                                                        html.encode('utf-8'))
+    return site
+
+def serve_fixture_site(options, port_queue):
+    """Serve a generated site on a free localhost port until terminated"""
+    site = build_fixture_site(options['pages'], options['fanout'], options['depth'],
+                              options['images'], options['page_kb'], options['seed'])
+    latency = options['latency_ms'] / 1000
+    counts = Counter()
+    lock = threading.Lock()
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like a real server
+
+        def do_GET(self):
+            path = self.path.split('?')[0].split('#')[0]
+            if path == '/__stats':
+                with lock:
+                    return self.send(200, 'application/json', json.dumps(counts).encode())
+            if latency:
+                time.sleep(latency)
+
+            host = f"http://{self.headers.get('Host')}"
+            key = path.rstrip('/') or '/'
+            if key == '/robots.txt':
+                kind, status, content_type = 'robots', 200, 'text/plain'
+                body = f"User-agent: *\nAllow: /\n".encode()
+                if options['sitemap']:
+                    body += f"Sitemap: {host}/sitemap.xml\n".encode()
+            elif key == '/sitemap.xml' and options['sitemap']:
+                kind, status, content_type = 'sitemap', 200, 'application/xml'
+                locs = ''.join(f"<url><loc>{host}{fixture_href(i)}</loc></url>"
+                               for i in range(options['pages']))
+                body = (f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns='
+                        f'"http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>').encode()
+            elif key in site:
+                kind, status = 'page', 200
+                content_type, body = site[key]
+            else:
+                kind, status, content_type, body = 'not found', 404, 'text/plain', b'Not found'
+            with lock:
+                counts[kind] += 1
+                counts[f"path {key}"] += 1
+            self.send(status, content_type, body)
+
+        def send(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', options['port']), FixtureHandler)
+    server.daemon_threads = True
+    page_bytes = sum(len(body) for _, body in site.values())
+    port_queue.put((server.server_address[1], page_bytes))
+    server.serve_forever()
+
+@contextlib.contextmanager
+def fixture_server(args):
+    """Run serve_fixture_site in its own process so its CPU isn't counted as the crawler's"""
+    options = {key: getattr(args, key) for key in
+               ('pages', 'fanout', 'depth', 'images', 'page_kb', 'seed', 'latency_ms', 'port')}
+    options['sitemap'] = not args.no_sitemap
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_fixture_site, args=(options, port_queue),
+                                      daemon=True)
+    process.start()
+    try:
+        port, page_bytes = port_queue.get(timeout=120)
+        yield f"http://127.0.0.1:{port}/", page_bytes
+    finally:
+        process.terminate()
+        process.join()
+
+def resource_usage():
+    """(CPU seconds of this process and its finished children, peak RSS in MB)"""
+    if resource is None:
+        return time.process_time(), None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return cpu, max(own.ru_maxrss, children.ru_maxrss) / scale
+
+def bench_site(args):
+    with fixture_server(args) as (base_url, page_bytes):
+        print(f"Fixture site: {base_url}, {args.pages} pages, fan-out {args.fanout}, "
+              f"~{page_bytes / args.pages / 1024:.0f} KB/page, section depth {args.depth}, "
+              f"{args.images} images/section, {args.latency_ms:g} ms latency")
+        if args.serve:
+            print("Serving until Ctrl-C")
+            with contextlib.suppress(KeyboardInterrupt):
+                while True:
+                    time.sleep(1)
+            return
+
+        with tempfile.TemporaryDirectory() as workdir:
+            scraper = WebsiteScraper(base_url, max_workers=args.workers,
+                                     max_per_host=args.per_host or args.workers, min_delay=0,
+                                     output_path=os.path.join(workdir, 'pages.jsonl'),
+                                     keep_pages=False, parser_backend=args.parser,
+                                     parse_processes=args.parse_processes,
+                                     adaptive=False)
+            cpu_before, _ = resource_usage()
+            started = time.perf_counter()
+            # The crawl's own progress output would drown the numbers
+            with open(os.devnull, 'w') as devnull, \
+                 contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                scraper.scrape_all()
+            elapsed = time.perf_counter() - started
+            cpu_after, peak_rss = resource_usage()
+
+        with urlopen(f"{base_url}__stats") as response:
+            counts = json.load(response)
+
+    summary = scraper.metrics.summary()
+    cpu = cpu_after - cpu_before
+    duplicates = sum(count - 1 for key, count in counts.items()
+                     if key.startswith('path ') and count > 1)
+    results = {
+        'pages': scraper.pages_found,
+        'seconds': elapsed,
+        'pages_per_sec': scraper.pages_found / elapsed if elapsed else 0.0,
+        'cpu_seconds': cpu,
+        'cpu_ms_per_page': cpu / scraper.pages_found * 1000 if scraper.pages_found else 0.0,
+        'peak_rss_mb': peak_rss,
+        'crawler_requests': summary['requests'],
+        'crawler_status_codes': summary['status_codes'],
+        'server_requests': {key: count for key, count in counts.items()
+                            if not key.startswith('path ')},
+        'duplicate_requests': duplicates,
+    }
+    mode = (f"{args.parse_processes} parse processes" if args.parse_processes
+            else "parsing in fetch threads")
+    print(f"Crawler: {args.workers} workers, {args.per_host or args.workers} per host, "
+          f"{args.parser}, {mode}")
+    print(f"Pages scraped:   {results['pages']} in {elapsed:.2f}s "
+          f"({results['pages_per_sec']:.1f} pages/sec)")
+    print(f"CPU time:        {cpu:.2f}s ({results['cpu_ms_per_page']:.1f} ms/page, "
+          f"{cpu / elapsed * 100 if elapsed else 0:.0f}% of one core)")
+    print("Peak RSS:        " + (f"{peak_rss:.0f} MB" if peak_rss is not None else "n/a"))
+    print(f"Requests:        {summary['requests']} by the crawler ("
+          + ', '.join(f"{code}: {count}" for code, count in sorted(summary['status_codes'].items()))
+          + "); server saw " + ', '.join(f"{count} {kind}" for kind, count
+                                           in sorted(results['server_requests'].items()))
+          + f", {duplicates} repeated")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            options = {key: value for key, value in vars(args).items() if key != 'func'}
+            json.dump(dict(results, options=options), f, indent=2)
+        print(f"Results saved to {args.json}")
+
+def bench_distributed(args):
+    with fixture_server(args) as (base_url, _):
+        print(f"Fixture site: {base_url}, {args.pages} pages, {args.latency_ms:g} ms latency; "
+              f"{args.workers} fetch threads per worker process; {os.cpu_count()} CPUs")
+        print(f"{'processes':>10}{'pages':>8}{'time':>9}{'pages/sec':>11}{'speed-up':>10}"
+              f"{'efficiency':>12}{'CPU':>8}")
+        baseline = None
+        for processes in args.processes:
+            with tempfile.TemporaryDirectory() as workdir:
+                db_path = os.path.join(workdir, 'shared.sqlite3')
+                start_crawl(db_path, base_url)
+                cpu_before, _ = resource_usage()
+                started = time.perf_counter()
+                run_local(db_path, processes, quiet=not args.verbose,
+                          max_workers=args.workers, max_per_host=args.workers, min_delay=0,
+                          adaptive=False, parser_backend=args.parser)
+                elapsed = time.perf_counter() - started
+                cpu_after, _ = resource_usage()
+                conn = connect(db_path)
+                counts, pages, _ = crawl_status(conn)
+                conn.close()
+            rate = pages / elapsed if elapsed else 0.0
+            baseline = baseline or rate / processes
+            print(f"{processes:>10}{pages:>8}{elapsed:>8.2f}s{rate:>11.1f}"
+                  f"{rate / (baseline * args.processes[0]):>9.2f}x"
+                  f"{rate / (baseline * processes) * 100:>11.0f}%{cpu_after - cpu_before:>7.1f}s")
+            if counts['queued'] or counts['leased'] or counts['failed']:
+                print(f"  unfinished URLs left behind: {counts}")
+                sys.exit(1)
+
+def write_fixture_photos(directory, count, width, height, seed=0):
+    """count photo-like JPEGs (gradient plus blotchy noise) of width x height"""
+    Image = image_variants.Image
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for index in range(count):
+        colours = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+        img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+        img = Image.composite(Image.new('RGB', img.size, colours[0]),
+                              Image.new('RGB', img.size, colours[1]), img.convert('L'))
+        # Coarse noise scaled up keeps detail at every variant width, like a photo
+        noise = Image.effect_noise((width // 6, height // 6), 60).resize((width, height),
+                                                                        Image.BICUBIC)
+        Image.blend(img, noise.convert('RGB'), 0.3).save(os.path.join(directory, f"photo-{index}.jpg"), quality=90)
+
+def bench_variants(args):
+    if image_variants.Image is None:
+        print("The variants benchmark needs Pillow (pip install Pillow)")
+        sys.exit(1)
+    with tempfile.TemporaryDirectory() as workdir:
+        public_dir = os.path.join(workdir, 'public')
+        source_dir = os.path.join(public_dir, 'assets', 'images')
+        options = dict(widths=args.widths, formats=args.formats, source_dir=source_dir,
+                       output_dir=os.path.join(public_dir, 'assets', 'responsive'),
+                       public_dir=public_dir, manifest_path=os.path.join(workdir, 'variants.json'),
+                       media_assets=os.path.join(workdir, 'none.json'))
+        write_fixture_photos(os.path.join(source_dir, 'photos'), args.images,
+                             args.width, args.height)
+        print(f"{args.images} photos of {args.width}x{args.height}; widths {args.widths}, "
+              f"formats {args.formats}; {os.cpu_count()} CPUs")
+        print(f"{'run':<28}{'encoded':>8}{'skipped':>8}{'time':>9}")
+
+        def run(label, **extra):
+            started = time.perf_counter()
+            stats = image_variants.build_variants(**dict(options, **extra))
+            print(f"{label:<28}{stats['encoded']:>8}{stats['skipped']:>8}"
+                  f"{time.perf_counter() - started:>8.2f}s")
+            return stats
+
+        for processes in args.processes:
+            run(f"cold, {processes} processes", processes=processes, force=True)
+        run("re-run, nothing changed")
+        os.utime(os.path.join(source_dir, 'photos', 'photo-0.jpg'))
+        run("re-run, one photo touched")
+
+        with open(options['manifest_path'], 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        images = manifest['images'].values()
+        original = sum(entry['bytes'] for entry in images)
+        print(f"Originals: {original / 1024:.0f} KB")
+        for fmt in manifest['settings']['formats']:
+            # Grouped by each variant's real width: an image narrower than the
+            # largest breakpoint ends with a variant at its own width
+            by_width = {}
+            for entry in images:
+                for variant in entry['variants'][fmt]:
+                    totals = by_width.setdefault(variant['width'], [0, 0, 0])
+                    totals[0] += 1
+                    totals[1] += variant['bytes']
+                    totals[2] += entry['bytes']
+            for width, (count, size, source) in sorted(by_width.items()):
+                print(f"  {fmt} {width}w: {count} images, {size / 1024:.0f} KB "
+                      f"({source / size:.1f}x smaller than their originals)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for scraper.py")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sections = commands.add_parser('sections', help="legacy vs single-pass extract_sections")
+    sections.add_argument('--sections', type=int, default=60, help="top-level sections in the page")
+    sections.add_argument('--depth', type=int, default=3, help="nesting depth of each section")
+    sections.add_argument('--repeat', type=int, default=3)
+    sections.add_argument('--seed', type=int, default=0)
+    sections.set_defaults(func=bench_sections)
+
+    parsers = commands.add_parser('parsers', help="check parser backends agree, then time them")
+    parsers.add_argument('--pages', type=int, default=5, help="generated fixture pages")
+    parsers.add_argument('--sections', type=int, default=30, help="top-level sections per page")
+    parsers.add_argument('--repeat', type=int, default=3)
+    parsers.set_defaults(func=bench_parsers)
+
+    techs = commands.add_parser('fingerprints', help="technology detection cost vs rule count")
+    techs.add_argument('--sections', type=int, default=30, help="top-level sections in the page")
+    techs.add_argument('--extra', type=int, nargs='+', default=[0, 100, 300, 1000],
+                       help="synthetic rules added on top of tech_fingerprints.json")
+    techs.add_argument('--repeat', type=int, default=5)
+    techs.set_defaults(func=bench_fingerprints)
+
+    visited = commands.add_parser('visited', help="memory of the visited-URL set at 1M+ URLs")
+    visited.add_argument('--urls', type=int, default=1_000_000, help="URLs added to each set")
+    visited.add_argument('--probes', type=int, default=100_000,
+                         help="lookups of seen and unseen URLs")
+    visited.add_argument('--kinds', nargs='+', choices=VISITED_SET_KINDS, default=list(VISITED_SET_KINDS))
+    visited.add_argument('--error-rate', type=float, default=0.001,
+                         help="Bloom filter false-positive rate")
+    visited.set_defaults(func=bench_visited)
+
+    charset = commands.add_parser('charset', help="decoding pages with and without a declared charset")
+    charset.add_argument('--sections', type=int, default=30, help="top-level sections per page")
+    charset.add_argument('--repeat', type=int, default=5)
+    charset.set_defaults(func=bench_charset)
+
+    site = commands.add_parser('site', help="crawl a generated site served from localhost")
+    site.add_argument('--pages', type=int, default=200, help="pages in the site")
+    site.add_argument('--fanout', type=int, default=10, help="child pages linked from each page")
+    site.add_argument('--depth', type=int, default=3, help="section nesting depth")
+    site.add_argument('--images', type=int, default=3, help="images per top-level section")
+    site.add_argument('--page-kb', type=float, default=40, help="approximate HTML size per page")
+    site.add_argument('--latency-ms', type=float, default=20, help="server delay per request")
+    site.add_argument('--no-sitemap', action='store_true',
+                      help="serve no sitemap, so every page must be found through links")
+    site.add_argument('--seed', type=int, default=0)
+    site.add_argument('--port', type=int, default=0, help="server port (default: any free port)")
+    site.add_argument('--workers', type=int, default=8)
+    site.add_argument('--per-host', type=int, default=None, help="default: same as --workers")
+    site.add_argument('--parse-processes', type=int, default=0)
+    site.add_argument('--parser', choices=available_backends(), default='lxml')
+    site.add_argument('--json', help="also save the results to this file")
+    site.add_argument('--verbose', action='store_true', help="show the crawler's own output")
+    site.add_argument('--serve', action='store_true',
+                      help="just serve the site (to point scraper.py at it) until Ctrl-C")
+    site.set_defaults(func=bench_site)
+
+    distributed = commands.add_parser('distributed',
+                                      help="crawl the fixture site with 1, 2, 4... worker processes")
+    distributed.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8])
+    distributed.add_argument('--workers', type=int, default=2, help="fetch threads per process")
+    distributed.add_argument('--pages', type=int, default=200, help="pages in the site")
+    distributed.add_argument('--fanout', type=int, default=10)
+    distributed.add_argument('--depth', type=int, default=3, help="section nesting depth")
+    distributed.add_argument('--images', type=int, default=3)
+    distributed.add_argument('--page-kb', type=float, default=40)
+    distributed.add_argument('--latency-ms', type=float, default=100, help="server delay per request")
+    distributed.add_argument('--no-sitemap', action='store_true')
+    distributed.add_argument('--seed', type=int, default=0)
+    distributed.add_argument('--port', type=int, default=0)
+    distributed.add_argument('--parser', choices=available_backends(), default='lxml')
+    distributed.add_argument('--verbose', action='store_true', help="show the workers' own output")
+    distributed.set_defaults(func=bench_distributed)
+
+    variants = commands.add_parser('variants',
+                                   help="encode responsive WebP/AVIF variants of generated photos")
+    variants.add_argument('--images', type=int, default=12, help="generated photos")
+    variants.add_argument('--width', type=int, default=2560)
+    variants.add_argument('--height', type=int, default=1707)
+    variants.add_argument('--widths', type=int, nargs='+', default=list(image_variants.DEFAULT_WIDTHS))
+    variants.add_argument('--formats', nargs='+', default=list(image_variants.DEFAULT_FORMATS))
+    variants.add_argument('--processes', type=int, nargs='+', default=[1, os.cpu_count()])
+    variants.set_defaults(func=bench_variants)
+
+    args = parser.parse_args()
+    args.func(args)
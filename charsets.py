@@ -0,0 +1,72 @@
+import codecs
+import re
+
+# Decode an HTML body once, straight from the bytes. requests' response.text
+# decodes again on every access and, when the headers name no charset, either
+# assumes ISO-8859-1 or runs a slow statistical detector over the whole page.
+# This follows the browser order instead:
+#
+#   1. a byte order mark
+#   2. the charset in the Content-Type header
+#   3. <meta charset> / <meta http-equiv="Content-Type"> in the first 4 KB
+#   4. UTF-8 if the bytes are valid UTF-8, else windows-1252
+#
+# A BOM is checked before the header because browsers let it win: it can't
+# be there by accident, while a server-wide charset header often is wrong.
+
+META_SNIFF_BYTES = 4096
+
+_HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+_META_CHARSET = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+_BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'),
+         (codecs.BOM_UTF16_LE, 'utf-16'),
+         (codecs.BOM_UTF16_BE, 'utf-16'))
+
+# Labels the HTML standard maps onto a different decoder
+_LABEL_OVERRIDES = {'iso-8859-1': 'cp1252', 'latin-1': 'cp1252', 'latin1': 'cp1252',
+                    'us-ascii': 'cp1252', 'ascii': 'cp1252'}
+
+def _codec(label):
+    """Python codec name for a charset label, or None if it is unknown"""
+    if not label:
+        return None
+    label = label.strip().lower()
+    label = _LABEL_OVERRIDES.get(label, label)
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return None
+
+def detect_encoding(content, headers=None):
+    """(codec name, where it came from) for an HTML body"""
+    for bom, codec in _BOMS:
+        if content.startswith(bom):
+            return codec, 'bom'
+
+    content_type = (headers or {}).get('Content-Type', '')
+    match = _HEADER_CHARSET.search(content_type)
+    codec = _codec(match.group(1)) if match else None
+    if codec:
+        return codec, 'header'
+
+    match = _META_CHARSET.search(content[:META_SNIFF_BYTES])
+    codec = _codec(match.group(1).decode('ascii', 'replace')) if match else None
+    if codec:
+        # A page that could be read far enough to find the meta tag is
+        # ASCII-compatible, whatever it claims
+        if codec.startswith('utf-16'):
+            codec = 'utf-8'
+        return codec, 'meta'
+
+    return None, 'default'
+
+def decode_html(content, headers=None):
+    """Decode an HTML body once; returns (text, codec name, where the codec came from)"""
+    codec, source = detect_encoding(content, headers)
+    if codec is not None:
+        return content.decode(codec, errors='replace'), codec, source
+    try:
+        return content.decode('utf-8'), 'utf-8', source
+    except UnicodeDecodeError:
+        return content.decode('cp1252', errors='replace'), 'cp1252', source
@@ -0,0 +1,222 @@
+import heapq
+import json
+import math
+import threading
+import time
+from collections import Counter
+
+# Per-request timings for scraper.py. Every fetch records how long it spent
+# in each phase. Once the crawl is done with a URL, its record is appended to
+# a JSONL file and folded into running totals, so memory stays flat however
+# many URLs a crawl covers. Percentiles come from log-scale histograms (within
+# 2% of the exact value) and only the slowest URLs are kept.
+
+PHASES = (
+    'wait',         # queued behind the per-host throttle
+    'ttfb',         # request sent until response headers (includes DNS, connect and TLS)
+    'download',     # reading the body
+    'parse',        # building the HTML tree
+    'extract',      # extract_sections
+    'fingerprint',  # detect_cms
+)
+
+BUCKET_GROWTH = 1.02    # each histogram bucket is 2% wider than the one before
+SMALLEST_TIME = 1e-6    # anything quicker shares the first bucket
+SLOWEST_KEPT = 10
+# Doubling buckets from 10ms for the request time histogram in the report
+REPORT_EDGES = [0.01 * 2 ** i for i in range(12)]
+
+class LatencyHistogram:
+    """Count, sum, max and log-scale bucket counts of one phase's timings"""
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = 0
+        if seconds > SMALLEST_TIME:
+            index = math.ceil(math.log(seconds / SMALLEST_TIME, BUCKET_GROWTH))
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct):
+        """Nearest-rank percentile, as the upper edge of its bucket"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(SMALLEST_TIME * BUCKET_GROWTH ** index, self.max)
+        return self.max
+
+    def stats(self):
+        return {'count': self.count, 'p50': self.percentile(50), 'p95': self.percentile(95),
+                'p99': self.percentile(99), 'max': self.max, 'sum': self.sum}
+
+def report_bucket(total):
+    return next((f"<{edge * 1000:.0f}ms" for edge in REPORT_EDGES if total < edge),
+                f">={REPORT_EDGES[-1] * 1000:.0f}ms")
+
+class CrawlMetrics:
+    """Thread-safe collector of per-URL timings, byte counts and status codes.
+
+    records_path, if given, gets one JSON line per finished request."""
+    def __init__(self, records_path=None):
+        self._lock = threading.Lock()
+        self.pending = {}   # url -> record of a request the crawl isn't done with
+        self.records_path = records_path
+        self.records_file = open(records_path, 'w', encoding='utf-8') if records_path else None
+        self.requests = 0
+        self.bytes = 0
+        self.from_cache = 0
+        self.status_codes = Counter()
+        self.aborted = Counter()
+        self.wasted_bytes = 0
+        self.phases = {}    # phase (or 'total') -> LatencyHistogram
+        self.report_buckets = Counter()
+        self.slowest = []   # min-heap of (total, sequence, entry)
+        self.head_probes = 0
+
+    def _record(self, url):
+        if url not in self.pending:
+            self.pending[url] = {'url': url, 'status': None, 'bytes': 0,
+                                 'from_cache': False, 'aborted': None, 'timings': {}}
+        return self.pending[url]
+
+    def record_fetch(self, url, status, nbytes, timings, from_cache=False):
+        with self._lock:
+            record = self._record(url)
+            record['status'] = status
+            record['bytes'] = nbytes
+            record['from_cache'] = from_cache
+            record['timings'].update(timings)
+
+    def record_abort(self, url, reason):
+        """Mark a download given up on; its recorded bytes count as wasted"""
+        with self._lock:
+            self._record(url)['aborted'] = reason
+
+    def record_probe(self):
+        with self._lock:
+            self.head_probes += 1
+
+    def record_timings(self, url, timings):
+        with self._lock:
+            self._record(url)['timings'].update(timings)
+
+    def finish(self, url):
+        """Fold url's record into the totals and the records file; call once
+        the crawl is done with it (stored, failed or sent back for a retry)"""
+        with self._lock:
+            record = self.pending.pop(url, None)
+            if record is not None:
+                self._add(record)
+
+    def _add(self, record):
+        # Throttle wait is a property of the crawl, not of the page, so the
+        # total (and the slowest-URLs ranking) leaves it out
+        total = sum(seconds for phase, seconds in record['timings'].items() if phase != 'wait')
+        self.requests += 1
+        self.bytes += record['bytes']
+        self.from_cache += record['from_cache']
+        self.status_codes[str(record['status'])] += 1
+        if record['aborted']:
+            self.aborted[record['aborted']] += 1
+            self.wasted_bytes += record['bytes']
+        for phase, seconds in list(record['timings'].items()) + [('total', total)]:
+            if phase not in self.phases:
+                self.phases[phase] = LatencyHistogram()
+            self.phases[phase].add(seconds)
+        self.report_buckets[report_bucket(total)] += 1
+
+        entry = (total, self.requests, {'url': record['url'], 'total': total,
+                                        'status': record['status'], 'bytes': record['bytes']})
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+        if self.records_file:
+            self.records_file.write(json.dumps(dict(record, total=total)) + '\n')
+
+    def summary(self):
+        """Aggregate numbers: per-phase percentiles, statuses, bytes, slowest URLs"""
+        with self._lock:
+            # Requests still open when a crawl is cut short count as they stand
+            for url in list(self.pending):
+                self._add(self.pending.pop(url))
+            order = ([f"<{edge * 1000:.0f}ms" for edge in REPORT_EDGES] +
+                     [f">={REPORT_EDGES[-1] * 1000:.0f}ms"])
+            return {
+                'requests': self.requests,
+                'bytes': self.bytes,
+                'from_cache': self.from_cache,
+                'status_codes': dict(self.status_codes),
+                'head_probes': self.head_probes,
+                'aborted': dict(self.aborted),
+                'wasted_bytes': self.wasted_bytes,
+                'phases': {phase: self.phases[phase].stats()
+                           for phase in PHASES + ('total',) if phase in self.phases},
+                'histogram': [{'bucket': label, 'count': self.report_buckets[label]}
+                              for label in order if self.report_buckets[label]],
+                'slowest': [entry for _, _, entry in sorted(self.slowest, reverse=True)],
+            }
+
+    def report(self):
+        """Human-readable crawl timing report"""
+        summary = self.summary()
+        if not summary['requests']:
+            return "No requests recorded."
+
+        lines = [f"Requests: {summary['requests']}, {summary['bytes'] / 1024:.1f} KB, "
+                 f"{summary['from_cache']} from cache, status codes "
+                 + ', '.join(f"{code}: {count}"
+                             for code, count in sorted(summary['status_codes'].items()))]
+        if summary['aborted'] or summary['head_probes']:
+            reasons = ', '.join(f"{reason}: {count}"
+                                for reason, count in sorted(summary['aborted'].items()))
+            lines.append(f"Aborted downloads: {sum(summary['aborted'].values())}"
+                         + (f" ({reasons})" if reasons else "")
+                         + f", {summary['wasted_bytes'] / 1024:.1f} KB read and thrown away; "
+                         f"{summary['head_probes']} HEAD probes")
+        lines.append(f"{'phase':<12}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}"
+                     f"{'max':>10}{'total':>10}")
+        for phase, stats in summary['phases'].items():
+            lines.append(f"{phase:<12}{stats['count']:>7}" +
+                         ''.join(f"{stats[key] * 1000:>8.1f}ms" for key in ('p50', 'p95', 'p99', 'max')) +
+                         f"{stats['sum']:>9.1f}s")
+
+        lines.append("Request time histogram (excluding throttle wait):")
+        peak = max(bucket['count'] for bucket in summary['histogram'])
+        for bucket in summary['histogram']:
+            bar = '#' * max(1, round(bucket['count'] / peak * 40))
+            lines.append(f"  {bucket['bucket']:>9} {bucket['count']:>6} {bar}")
+
+        lines.append("Slowest URLs:")
+        for record in summary['slowest']:
+            lines.append(f"  {record['total'] * 1000:>8.1f}ms  {str(record['status']):>5}  "
+                         f"{record['bytes'] / 1024:>7.1f} KB  {record['url']}")
+        return '\n'.join(lines)
+
+    def write_json(self, path):
+        """Save the summary; the per-request records are in records_path"""
+        data = self.summary()
+        data['generated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        data['records_file'] = self.records_path
+        with self._lock:
+            if self.records_file:
+                self.records_file.flush()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+    def close(self):
+        with self._lock:
+            if self.records_file:
+                self.records_file.close()
+                self.records_file = None
@@ -0,0 +1,199 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+from html_backends import PARSER_BACKENDS
+from page_stream import PageStreamWriter
+from scraper import WebsiteScraper
+from shared_frontier import SharedFrontier, connect, crawl_settings, crawl_status, start_crawl
+
+# Crawl one site with several scraper processes, on one machine or many,
+# coordinated through a SQLite file (see shared_frontier.py):
+#
+#   python distributed_crawl.py start https://example.com/ --db crawl.sqlite3
+#   python distributed_crawl.py worker --db crawl.sqlite3      (as many as you like)
+#   python distributed_crawl.py export --db crawl.sqlite3
+#
+# or all three on this machine with `run URL --processes N`. Workers can join
+# or be killed at any time; a killed worker's URLs are leased again once its
+# leases run out. Workers on other machines need the file on a filesystem
+# with working locks (not most NFS setups).
+
+DEFAULT_DB = 'scraped-content/metadata/shared_crawl.sqlite3'
+
+class CrawlWorker(WebsiteScraper):
+    """WebsiteScraper that takes its URLs from, and stores its pages in, a shared crawl"""
+    def __init__(self, db_path, worker_id=None, lease_seconds=60, **options):
+        if options.get('resume') or options.get('checkpoint_path'):
+            raise ValueError("a distributed crawl keeps its state in the shared database: "
+                             "to carry on, start more workers, without --resume or a checkpoint")
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        frontier = SharedFrontier(db_path, worker_id, lease_seconds=lease_seconds,
+                                  batch=max(1, options.get('max_workers', 1)))
+        super().__init__(frontier.base_url, frontier=frontier, **options)
+        self.worker_id = worker_id
+        # Only the first worker reads the sitemaps; the rest find their URLs queued
+        self.resuming = not frontier.claim('sitemaps')
+
+    def prepare_crawl(self):
+        super().prepare_crawl()
+        if not self.resuming:
+            self.frontier.finish_seeding()
+
+    def store_page(self, url, page_data):
+        """Write the finished URL, its page and its links to the shared crawl"""
+        slug = None
+        if page_data:
+            slug = self.create_slug(url)
+            self.pages_found += 1
+            if self.keep_pages:
+                self.scraped_data[slug] = page_data
+        self.frontier.finish(url, slug, page_data)
+        self.metrics.finish(url)
+        self.check_wordpress(page_data)
+
+    def check_wordpress(self, page_data):
+        # Only the first worker to see WordPress reads the REST API
+        if (self.wordpress_api and page_data and page_data['cms_info'].get('cms') == 'WordPress'
+                and not self.frontier.claim('wordpress_api')):
+            self.wordpress_api = False
+        super().check_wordpress(page_data)
+
+    def scrape_all(self):
+        print(f"Worker {self.worker_id} joining the crawl of {self.base_url}")
+        self.frontier.start_heartbeat()
+        try:
+            return super().scrape_all()
+        finally:
+            # Hands back anything still leased (Ctrl-C) straight away
+            self.frontier.close()
+
+def run_worker(db_path, quiet=False, **options):
+    """Crawl as one worker until the shared frontier is empty; returns pages stored"""
+    with open(os.devnull, 'w') as devnull, \
+         contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+        worker = CrawlWorker(db_path, keep_pages=False, **options)
+        worker.scrape_all()
+    return worker.pages_found
+
+def run_local(db_path, processes, quiet=False, **options):
+    """Run processes workers on this machine and wait for them all"""
+    workers = [multiprocessing.Process(target=run_worker, args=(db_path, quiet),
+                                       kwargs=dict(options, worker_id=f"{socket.gethostname()}-local{i}"))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [worker.exitcode for worker in workers]
+
+def export_pages(db_path, output_path):
+    """Write every stored page to output_path (.jsonl, .jsonl.gz or .jsonl.zst); returns the count"""
+    conn = connect(db_path)
+    output = PageStreamWriter(output_path)
+    for slug, data in conn.execute('SELECT slug, data FROM pages ORDER BY rowid'):
+        output.write(slug, json.loads(data))
+    output.close()
+    conn.close()
+    return output.count
+
+def print_status(db_path):
+    conn = connect(db_path)
+    base_url, max_depth, max_pages = crawl_settings(conn)
+    counts, pages, workers = crawl_status(conn)
+    conn.close()
+    print(f"Crawl of {base_url}: {pages} pages; " +
+          ', '.join(f"{count} {state}" for state, count in counts.items()))
+    now = time.time()
+    for worker, started, last_seen, fetched in workers:
+        print(f"  {worker}: {fetched} URLs, last seen {now - last_seen:.0f}s ago")
+
+def worker_options(args):
+    return dict(max_workers=args.workers, max_per_host=args.per_host or args.workers,
+                min_delay=args.delay, adaptive=not args.fixed_rate, max_rate=args.max_rate,
+                parser_backend=args.parser, parse_processes=args.parse_processes,
+                cache_dir=args.cache_dir, lease_seconds=args.lease_seconds,
+                wordpress_api=not args.no_wp_api)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl one site with several worker processes")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def crawl_arguments(command):
+        command.add_argument('--db', default=DEFAULT_DB, help="shared crawl database")
+
+    def budget_arguments(command):
+        command.add_argument('url', help="site to crawl")
+        command.add_argument('--max-pages', type=int, default=None,
+                             help="stop after this many URLs across all workers")
+        command.add_argument('--max-depth', type=int, default=None,
+                             help="ignore links more than this many hops from the start page")
+
+    def fetch_arguments(command):
+        command.add_argument('--workers', type=int, default=4, help="fetch threads per process")
+        command.add_argument('--per-host', type=int, default=None,
+                             help="concurrent requests per host, per process (default: --workers)")
+        command.add_argument('--delay', type=float, default=1.0,
+                             help="minimum seconds between requests to the host, per process")
+        command.add_argument('--max-rate', type=float, default=10.0,
+                             help="ceiling for the adaptive request rate, per process")
+        command.add_argument('--fixed-rate', action='store_true',
+                             help="space requests by --delay only")
+        command.add_argument('--parser', choices=PARSER_BACKENDS, default='lxml')
+        command.add_argument('--parse-processes', type=int, default=0)
+        command.add_argument('--cache-dir', default=None,
+                             help="response cache for conditional re-crawls (default: none)")
+        command.add_argument('--lease-seconds', type=float, default=60,
+                             help="how long a URL stays with a worker that stops responding")
+        command.add_argument('--no-wp-api', action='store_true',
+                             help="crawl WordPress sites as HTML instead of reading the REST API")
+
+    start = commands.add_parser('start', help="set up a new crawl (forgets the old one)")
+    crawl_arguments(start)
+    budget_arguments(start)
+
+    worker = commands.add_parser('worker', help="join the crawl until its frontier is empty")
+    crawl_arguments(worker)
+    fetch_arguments(worker)
+    worker.add_argument('--id', default=None, help="worker name (default: host-pid)")
+
+    run = commands.add_parser('run', help="start a crawl, run N local workers, then export")
+    crawl_arguments(run)
+    budget_arguments(run)
+    fetch_arguments(run)
+    run.add_argument('--processes', type=int, default=os.cpu_count(), help="worker processes")
+    run.add_argument('--output', default='scraped-content/metadata/all_pages.jsonl')
+
+    status = commands.add_parser('status', help="show progress")
+    crawl_arguments(status)
+
+    export = commands.add_parser('export', help="write the stored pages as all_pages.jsonl")
+    crawl_arguments(export)
+    export.add_argument('--output', default='scraped-content/metadata/all_pages.jsonl')
+
+    args = parser.parse_args()
+    if args.command in ('start', 'run'):
+        start_crawl(args.db, args.url, max_depth=args.max_depth, max_pages=args.max_pages)
+        print(f"Started a crawl of {args.url} in {args.db}")
+    if args.command == 'worker':
+        run_worker(args.db, worker_id=args.id, **worker_options(args))
+    elif args.command == 'run':
+        started = time.monotonic()
+        exit_codes = run_local(args.db, args.processes, **worker_options(args))
+        elapsed = time.monotonic() - started
+        count = export_pages(args.db, args.output)
+        print(f"{args.processes} workers stored {count} pages in {elapsed:.1f}s "
+              f"({count / elapsed if elapsed else 0:.1f} pages/sec); written to {args.output}")
+        print_status(args.db)
+        if any(exit_codes):
+            sys.exit(1)
+    elif args.command == 'status':
+        print_status(args.db)
+    elif args.command == 'export':
+        count = export_pages(args.db, args.output)
+        print(f"Wrote {count} pages to {args.output}")
@@ -0,0 +1,175 @@
+import json
+import re
+from pathlib import Path
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Technology fingerprinting for scraper.py. Rules live in tech_fingerprints.json:
+#
+#   {"name": "WordPress", "category": "cms",
+#    "meta":    {"generator": "^wordpress"},    regex on <meta name=...> content
+#    "headers": {"x-pingback": "xmlrpc\\.php"}, regex on a response header ("" = present)
+#    "urls":    ["/wp-content/"],               substring of a script src / link href
+#    "body":    ["wp-emoji-release.min.js"]}    substring of the raw HTML
+#
+# All matching is case-insensitive. Every rule is compiled once; each page is
+# then scanned once per location, however many rules there are.
+#
+# A page can match several cms rules: a WordPress site may embed a Contentful
+# image or a HubSpot form. The cms reported is the one with the strongest
+# evidence, a generator tag or header outweighing an asset URL, and an asset
+# URL outweighing a string somewhere in the HTML.
+
+DEFAULT_RULES_FILE = Path(__file__).with_name('tech_fingerprints.json')
+
+# How much one match in each location counts towards a rule's evidence
+EVIDENCE_WEIGHTS = {'meta': 4, 'headers': 3, 'urls': 2, 'body': 1}
+
+class LiteralMatcher:
+    """Find which of many lowercase substrings occur in a text, in one scan"""
+    def __init__(self, literals):
+        self.literals = sorted(set(literals))
+        self.automaton = None
+        self.regex = None
+        self.literal_set = set(self.literals)
+        self.lengths = sorted({len(literal) for literal in self.literals})
+        if not self.literals:
+            return
+
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for literal in self.literals:
+                self.automaton.add_word(literal, literal)
+            self.automaton.make_automaton()
+        else:
+            # Without pyahocorasick, fold the literals into a prefix trie so
+            # the regex branches on one character at a time instead of
+            # trying every literal at every position. It still slows down as
+            # rules are added (~3x at 1000 rules), which is why
+            # pyahocorasick is in requirements.txt. The regex reports only the
+            # longest literal at each position; scan() adds the shorter
+            # ones, which can only be prefixes of it
+            self.regex = re.compile(f"(?=({self._trie_pattern(self.literals)}))")
+
+    @staticmethod
+    def _trie_pattern(literals):
+        trie = {}
+        for literal in literals:
+            node = trie
+            for char in literal:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def render(node):
+            end = '' in node
+            branches = [re.escape(char) + render(child)
+                        for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+            if end:
+                return f"(?:{body})?"
+            return body
+
+        return render(trie)
+
+    def scan(self, text):
+        """Return the set of literals found in text (already lowercased)"""
+        if self.automaton is not None:
+            return {literal for _, literal in self.automaton.iter(text)}
+        if self.regex is not None:
+            found = set()
+            for match in self.regex.finditer(text):
+                longest = match.group(1)
+                if longest in found:
+                    continue
+                for length in self.lengths:
+                    if length > len(longest):
+                        break
+                    if longest[:length] in self.literal_set:
+                        found.add(longest[:length])
+            return found
+        return set()
+
+class Fingerprinter:
+    """Compiled rule set that detects every matching technology on a page"""
+    def __init__(self, rules):
+        self.rules = rules
+        self.meta_rules = {}    # meta name -> [(regex, rule index)]
+        self.header_rules = {}  # header name -> [(regex, rule index)]
+        url_literals = {}       # literal -> {rule index}
+        body_literals = {}
+
+        for index, rule in enumerate(rules):
+            for name, pattern in rule.get('meta', {}).items():
+                self.meta_rules.setdefault(name.lower(), []).append(
+                    (re.compile(pattern, re.IGNORECASE), index))
+            for name, pattern in rule.get('headers', {}).items():
+                self.header_rules.setdefault(name.lower(), []).append(
+                    (re.compile(pattern, re.IGNORECASE), index))
+            for literal in rule.get('urls', []):
+                url_literals.setdefault(literal.lower(), set()).add(index)
+            for literal in rule.get('body', []):
+                body_literals.setdefault(literal.lower(), set()).add(index)
+
+        self.url_literals = url_literals
+        self.body_literals = body_literals
+        self.url_matcher = LiteralMatcher(url_literals)
+        self.body_matcher = LiteralMatcher(body_literals)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES_FILE):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def detect(self, soup, headers, html):
+        """Return {'cms', 'technologies', 'categories', 'meta_generator'} for a page"""
+        evidence = {}  # rule index -> weight of its matches
+        meta_generator = None
+
+        for meta in soup.find_all('meta'):
+            name = (meta.get('name') or '').lower()
+            if not name:
+                continue
+            content = meta.get('content', '')
+            if name == 'generator' and meta_generator is None:
+                meta_generator = content
+            for regex, index in self.meta_rules.get(name, ()):
+                if regex.search(content):
+                    evidence[index] = evidence.get(index, 0) + EVIDENCE_WEIGHTS['meta']
+
+        for name, value in headers.items():
+            for regex, index in self.header_rules.get(name.lower(), ()):
+                if regex.search(value):
+                    evidence[index] = evidence.get(index, 0) + EVIDENCE_WEIGHTS['headers']
+
+        if self.url_literals:
+            asset_urls = [tag.get('src') or tag.get('href') or ''
+                          for tag in soup.find_all(['script', 'link'])]
+            for literal in self.url_matcher.scan('\n'.join(asset_urls).lower()):
+                for index in self.url_literals[literal]:
+                    evidence[index] = evidence.get(index, 0) + EVIDENCE_WEIGHTS['urls']
+
+        if self.body_literals:
+            for literal in self.body_matcher.scan(html.lower()):
+                for index in self.body_literals[literal]:
+                    evidence[index] = evidence.get(index, 0) + EVIDENCE_WEIGHTS['body']
+
+        detected = [self.rules[index] for index in sorted(evidence)]
+        # Strongest evidence wins; ties go to the rule listed first
+        cms_rules = [index for index in sorted(evidence) if self.rules[index].get('category') == 'cms']
+        cms = None
+        if cms_rules:
+            cms = self.rules[max(cms_rules, key=lambda index: (evidence[index], -index))]['name']
+        categories = {}
+        for rule in detected:
+            categories.setdefault(rule.get('category', 'other'), []).append(rule['name'])
+        return {
+            'cms': cms,
+            'technologies': [rule['name'] for rule in detected],
+            'categories': categories,
+            'meta_generator': meta_generator
+        }
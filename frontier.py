@@ -0,0 +1,193 @@
+import heapq
+import itertools
+import re
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from url_sets import ExactUrlSet
+
+# Crawl frontier for scraper.py. URLs are deduplicated when they are queued,
+# not when they are popped, and come out highest priority first:
+#
+#   priority = sitemap <priority> (0.5 when unknown)
+#            - 0.1 per link hop from the start page
+#            + up to 0.25 for a recent sitemap <lastmod>
+#            + the weight of every path pattern that matches
+#
+# so on a huge site the pages that matter are fetched before the budget runs out.
+
+DEFAULT_PATH_PRIORITIES = (
+    (r'^/?$', 1.0),
+    (r'^/(services?|solutions|about|contact|work|portfolio|clients|team|careers)(/|$)', 0.3),
+    (r'/(tag|tags|category|author|feed|comments|page/\d+|wp-json|xmlrpc\.php)(/|$)', -0.5),
+    (r'\.(css|js|json|xml|txt|ico|png|jpe?g|gif|svg|webp|avif|woff2?|ttf|eot|mp4)$', -1.0),
+)
+
+DEPTH_PENALTY = 0.1
+LASTMOD_BONUS = 0.25
+
+def parse_lastmod(value):
+    """Parse a sitemap <lastmod> (W3C datetime) into an aware datetime, or None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+class CrawlFrontier:
+    """Thread-safe priority queue of URLs with depth and page budgets"""
+    def __init__(self, max_depth=None, max_pages=None, path_priorities=DEFAULT_PATH_PRIORITIES,
+                 seen=None):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.path_priorities = [(re.compile(pattern, re.IGNORECASE), weight)
+                                for pattern, weight in path_priorities]
+        self._lock = threading.Lock()
+        self._heap = []                 # (-priority, insertion order, url)
+        self._order = itertools.count()
+        # Every URL ever queued; pass a compact set from url_sets for huge crawls
+        self.seen = seen if seen is not None else ExactUrlSet()
+        self.pending = {}               # url -> (priority, depth) waiting to be fetched
+        self.active = {}                # url -> (priority, depth) handed out, not yet done
+        self._retrying = set()
+        self.issued = 0
+        self.too_deep = 0
+        self.over_budget = 0
+
+    def score(self, url, depth, sitemap_priority=None, lastmod=None):
+        """Priority of a URL; higher is fetched sooner"""
+        score = 0.5 if sitemap_priority is None else sitemap_priority
+        score -= DEPTH_PENALTY * depth
+        if lastmod is not None:
+            age_days = (datetime.now(timezone.utc) - lastmod).days
+            score += LASTMOD_BONUS * max(0.0, 1 - age_days / 365)
+        path = urlparse(url).path or '/'
+        for regex, weight in self.path_priorities:
+            if regex.search(path):
+                score += weight
+        return round(score, 4)
+
+    def _budget_left(self):
+        return self.max_pages is None or self.issued < self.max_pages
+
+    def push(self, url, depth=0, sitemap_priority=None, lastmod=None):
+        """Queue url unless already seen or too deep; returns its priority or None.
+
+        A URL still waiting in the queue is re-queued if it turns up again
+        with a higher priority (a link found before its sitemap entry)."""
+        if self.max_depth is not None and depth > self.max_depth:
+            with self._lock:
+                self.too_deep += 1
+            return None
+        priority = self.score(url, depth, sitemap_priority, lastmod)
+        with self._lock:
+            if url in self.seen:
+                queued = self.pending.get(url)
+                if queued is None or queued[0] >= priority:
+                    return None
+            self.seen.add(url)
+            self._push(url, priority, depth)
+        return priority
+
+    def _push(self, url, priority, depth):
+        # Superseded heap entries are left in place and skipped by pop()
+        self.pending[url] = (priority, depth)
+        heapq.heappush(self._heap, (-priority, next(self._order), url))
+
+    def restore(self, queued, visited):
+        """Reload a checkpointed frontier: queued (url, depth, priority) rows and visited URLs"""
+        with self._lock:
+            self.seen.update(visited)
+            self.issued = len(visited)
+            for url, depth, priority in queued:
+                self.seen.add(url)
+                self._push(url, priority, depth)
+
+    def pop(self):
+        """Hand out the highest-priority URL, or None when empty or over budget"""
+        with self._lock:
+            while self._heap:
+                if not self._budget_left() and not self._retrying:
+                    return None
+                negative, _, url = heapq.heappop(self._heap)
+                entry = self.pending.get(url)
+                if entry is None or entry[0] != -negative:
+                    continue
+                if url in self._retrying:
+                    self._retrying.discard(url)
+                elif not self._budget_left():
+                    # Stays in the checkpoint, so --resume with a bigger
+                    # --max-pages picks it up again
+                    del self.pending[url]
+                    self.over_budget += 1
+                    continue
+                else:
+                    self.issued += 1
+                del self.pending[url]
+                self.active[url] = entry
+                return url
+            return None
+
+    def requeue(self, url):
+        """Put a handed-out URL back; it does not count against the budget again"""
+        with self._lock:
+            entry = self.active.pop(url, None)
+            if entry is None:
+                return
+            self._retrying.add(url)
+            self._push(url, *entry)
+
+    def done(self, url):
+        with self._lock:
+            self.active.pop(url, None)
+
+    def skip(self, url):
+        """Drop a handed-out URL that will not be fetched after all (refund its budget)"""
+        with self._lock:
+            if self.active.pop(url, None) is not None:
+                self.issued -= 1
+
+    def discard(self, url):
+        """Take url out of the crawl because it was fetched some other way.
+
+        Returns False if it was already handed out (or fetched)."""
+        with self._lock:
+            if url in self.active:
+                return False
+            if url in self.pending:
+                del self.pending[url]
+                return True
+            if url in self.seen:
+                return False
+            self.seen.add(url)
+            return True
+
+    def depth_of(self, url):
+        """Link depth of a URL that has been handed out"""
+        with self._lock:
+            entry = self.active.get(url)
+        return entry[1] if entry else 0
+
+    def __contains__(self, url):
+        return url in self.seen
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __bool__(self):
+        with self._lock:
+            return bool(self.pending) and (self._budget_left() or bool(self._retrying))
+
+    def summary(self):
+        parts = [f"Frontier: {self.issued} URLs fetched, "
+                 f"{len(self.pending) + self.over_budget} left in the queue"]
+        if self.max_depth is not None:
+            parts.append(f"{self.too_deep} links beyond depth {self.max_depth} skipped")
+        if self.max_pages is not None and not self._budget_left():
+            parts.append(f"stopped at the {self.max_pages}-page budget")
+        return ', '.join(parts)
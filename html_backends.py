@@ -0,0 +1,160 @@
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# HTML parser backends for scraper.py. BeautifulSoup's own backends return a
+# soup; the lexbor backend returns a thin wrapper exposing the small part of
+# the BeautifulSoup API the scraper uses (name, get, parent, children,
+# get_text, find, find_all).
+
+PARSER_BACKENDS = ('html.parser', 'lxml', 'lexbor')
+
+# BeautifulSoup leaves the contents of these out of get_text()
+_NON_TEXT_TAGS = frozenset(('script', 'style', 'template', '-comment'))
+
+def available_backends():
+    """Backends whose parser library is installed"""
+    backends = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        backends.append('lxml')
+    except ImportError:
+        pass
+    if LexborHTMLParser is not None:
+        backends.append('lexbor')
+    return backends
+
+def parse_html(markup, backend='lxml'):
+    """Parse markup (str or bytes) with the named backend"""
+    if backend == 'lexbor':
+        if LexborHTMLParser is None:
+            raise RuntimeError("The lexbor backend needs selectolax (pip install selectolax)")
+        return LexborDocument(LexborHTMLParser(markup))
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend {backend!r}, expected one of {PARSER_BACKENDS}")
+    return BeautifulSoup(markup, backend)
+
+def _matches(node, names, attrs):
+    if names and node.tag not in names:
+        return False
+    for key, wanted in attrs.items():
+        value = node.attributes.get(key)
+        if value is None:
+            return False
+        if hasattr(wanted, 'search'):
+            if not wanted.search(value):
+                return False
+        elif value != wanted:
+            return False
+    return True
+
+def _as_names(name):
+    if name is None or name is True:
+        return None
+    if isinstance(name, str):
+        return (name,)
+    return tuple(name)
+
+class LexborNode:
+    """BeautifulSoup-like view of a selectolax (lexbor) element"""
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    @property
+    def name(self):
+        return self.node.tag
+
+    def get(self, key, default=None):
+        attributes = self.node.attributes
+        if key not in attributes:
+            return default
+        value = attributes[key] or ''
+        # BeautifulSoup splits class into a list of names
+        if key == 'class':
+            return value.split()
+        return value
+
+    @property
+    def parent(self):
+        parent = self.node.parent
+        if parent is None or parent.tag.startswith('-'):
+            return None
+        return LexborNode(parent)
+
+    @property
+    def children(self):
+        for child in self.node.iter(include_text=False):
+            if not child.tag.startswith('-'):
+                yield LexborNode(child)
+
+    def get_text(self, strip=False):
+        node = self.node
+        if node.css_first('script, style, template') is None:
+            return node.text(deep=True, separator='', strip=strip)
+        texts = []
+        self._collect_text(node, texts, strip)
+        return ''.join(texts)
+
+    def _collect_text(self, node, texts, strip):
+        for child in node.iter(include_text=True):
+            if child.tag == '-text':
+                text = child.text_content or ''
+                if strip:
+                    text = text.strip()
+                if text:
+                    texts.append(text)
+            elif child.tag not in _NON_TEXT_TAGS:
+                self._collect_text(child, texts, strip)
+
+    # lexbor's css() and traverse() both include the node itself; a
+    # BeautifulSoup find only searches below it, except on the soup itself
+    _include_self = False
+
+    def find_all(self, name=None, attrs=None):
+        names = _as_names(name)
+        attrs = attrs or {}
+        if names and not attrs:
+            found = self.node.css(', '.join(names))
+        else:
+            found = [node for node in self.node.traverse(include_text=False)
+                     if not node.tag.startswith('-') and _matches(node, names, attrs)]
+        if not self._include_self:
+            found = [node for node in found if node != self.node]
+        return [LexborNode(node) for node in found]
+
+    def find(self, name=None, attrs=None):
+        names = _as_names(name)
+        attrs = attrs or {}
+        for node in self.node.traverse(include_text=False):
+            if not self._include_self and node == self.node:
+                continue
+            if not node.tag.startswith('-') and _matches(node, names, attrs):
+                return LexborNode(node)
+        return None
+
+class LexborDocument(LexborNode):
+    """Top of a lexbor tree, standing in for the BeautifulSoup object"""
+    __slots__ = ('tree',)
+    _include_self = True
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.node = tree.root
+
+    @property
+    def name(self):
+        return '[document]'
+
+    @property
+    def parent(self):
+        return None
+
+    @property
+    def children(self):
+        if self.node is not None:
+            yield LexborNode(self.node)
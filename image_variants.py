@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+# Responsive variants of the site's images. Every photo and graphic in
+# public/assets/images (the categories listed in data/media-assets.json) is
+# resized to each breakpoint it is wider than, plus its own width if that
+# is under the largest, and saved as WebP and AVIF:
+#
+#   public/assets/images/services/DSC01980-scaled-1.jpg
+#   -> public/assets/responsive/services/DSC01980-scaled-1.jpg-480w.webp ... -1920w.avif
+#
+# data/image-variants.json lists every variant's URL, width, height and
+# bytes, with a ready-made srcset per format, keyed by the original's URL.
+# An image whose variants are newer than it and were made with the same
+# settings is skipped, so a re-run only stats files; the rest are encoded
+# on a process pool, one image per task.
+
+PUBLIC_DIR = 'public'
+SOURCE_DIR = 'public/assets/images'
+OUTPUT_DIR = 'public/assets/responsive'
+MEDIA_ASSETS = 'data/media-assets.json'
+MANIFEST = 'data/image-variants.json'
+
+# Breakpoints from MOBILE_OPTIMIZATION_PLAN.md, plus full-HD heroes
+DEFAULT_WIDTHS = (480, 768, 1024, 1920)
+DEFAULT_FORMATS = ('webp', 'avif')
+# AVIF at speed 8 encodes ~3.5x faster than the default 6, for files 5-15% bigger
+ENCODER_OPTIONS = {'webp': {'quality': 80, 'method': 4},
+                   'avif': {'quality': 55, 'speed': 8}}
+SOURCE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+def variant_widths(width, widths):
+    """Breakpoints narrower than the image, plus the image's own width if it
+    is under the largest one (never upscaled)"""
+    chosen = [w for w in sorted(widths) if w < width]
+    if width <= max(widths):
+        chosen.append(width)
+    return chosen
+
+def public_url(path, public_dir=PUBLIC_DIR):
+    """/assets/... URL of a file under public_dir"""
+    return '/' + Path(path).relative_to(public_dir).as_posix()
+
+def source_categories(source_dir=SOURCE_DIR, media_assets=MEDIA_ASSETS):
+    """Directory under source_dir -> category name from media-assets.json"""
+    categories = {}
+    if os.path.exists(media_assets):
+        with open(media_assets, 'r', encoding='utf-8') as f:
+            assets = json.load(f)
+        for name, info in assets.get('images_by_category', {}).items():
+            try:
+                categories[Path(info.get('path', '')).relative_to(source_dir).as_posix()] = name
+            except ValueError:
+                pass
+    return categories
+
+def find_sources(source_dir=SOURCE_DIR):
+    """Every image under source_dir, sorted"""
+    return sorted(path for path in Path(source_dir).rglob('*')
+                  if path.suffix.lower() in SOURCE_EXTENSIONS and path.is_file())
+
+def is_current(source, entry, settings, public_dir=PUBLIC_DIR):
+    """Whether entry (from the last manifest) still describes source's variants"""
+    if not entry or entry.get('settings') != settings:
+        return False
+    mtime = os.path.getmtime(source)
+    if entry.get('mtime') != mtime:
+        return False
+    for variants in entry['variants'].values():
+        for variant in variants:
+            path = Path(public_dir) / variant['src'].lstrip('/')
+            if not path.exists() or os.path.getmtime(path) < mtime:
+                return False
+    return True
+
+def render_variants(task):
+    """Encode one image's variants (in a pool process); returns (source, entry, error)"""
+    source, settings, source_dir, output_dir, public_dir = task
+    relative = Path(source).relative_to(source_dir)
+    try:
+        with Image.open(source) as img:
+            # Orientations 5-8 turn the stored image on its side
+            rotated = img.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+            width, height = img.size[::-1] if rotated else img.size
+            widths = variant_widths(width, settings['widths'])
+            # JPEGs can decode straight at a fraction of their size
+            largest = (widths[-1], max(1, round(height * widths[-1] / width)))
+            img.draft(None, largest[::-1] if rotated else largest)
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                has_alpha = img.mode in ('LA', 'PA', 'RGBa') or 'transparency' in img.info
+                img = img.convert('RGBA' if has_alpha else 'RGB')
+
+            entry = {'width': width, 'height': height, 'bytes': os.path.getsize(source),
+                     'mtime': os.path.getmtime(source), 'settings': settings,
+                     'variants': {fmt: [] for fmt in settings['formats']}}
+            for w in widths:
+                h = max(1, round(height * w / width))
+                resized = img if img.size == (w, h) else img.resize((w, h), Image.LANCZOS)
+                for fmt in settings['formats']:
+                    # The full name, so photo.jpg and photo.png don't share variants
+                    path = Path(output_dir) / relative.parent / f"{relative.name}-{w}w.{fmt}"
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = path.with_name(path.name + '.tmp')
+                    resized.save(tmp_path, fmt.upper(), **settings['options'][fmt])
+                    os.replace(tmp_path, path)
+                    entry['variants'][fmt].append({'src': public_url(path, public_dir),
+                                                   'width': w, 'height': h,
+                                                   'bytes': os.path.getsize(path)})
+    except Exception as e:
+        # e.g. the empty placeholder logo and favicon, or a decompression bomb;
+        # anything Pillow raises stays with this image instead of ending the run
+        return str(source), None, f"{type(e).__name__}: {str(e)}"
+    return str(source), entry, None
+
+def srcset(variants):
+    return ', '.join(f"{v['src']} {v['width']}w" for v in variants)
+
+def build_variants(widths=DEFAULT_WIDTHS, formats=DEFAULT_FORMATS, processes=None,
+                   source_dir=SOURCE_DIR, output_dir=OUTPUT_DIR, public_dir=PUBLIC_DIR,
+                   manifest_path=MANIFEST, media_assets=MEDIA_ASSETS, force=False):
+    """Bring every image's variants and the manifest up to date; returns run stats"""
+    unsupported = [fmt for fmt in formats if not features.check(fmt)]
+    for fmt in unsupported:
+        print(f"This Pillow can't write {fmt}; skipping it")
+    formats = [fmt for fmt in formats if fmt not in unsupported]
+    # 'names' marks variants named after the full file name; older ones are redone
+    settings = {'widths': sorted(widths), 'formats': formats,
+                'options': {fmt: ENCODER_OPTIONS[fmt] for fmt in formats}, 'names': 'full'}
+    old_manifest = ''
+    old = {}
+    old_unreadable = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            old_manifest = f.read()
+        previous = json.loads(old_manifest)
+        old = previous.get('images', {})
+        old_unreadable = previous.get('unreadable', {})
+
+    sources = find_sources(source_dir)
+    images = {}
+    unreadable = {}
+    stale = []
+    for source in sources:
+        url = public_url(source, public_dir)
+        if not force and is_current(source, old.get(url), settings, public_dir):
+            images[url] = old[url]
+        elif not force and url in old_unreadable \
+                and old_unreadable[url]['mtime'] == os.path.getmtime(source):
+            unreadable[url] = old_unreadable[url]
+        else:
+            stale.append(source)
+
+    encoded = 0
+    started = time.perf_counter()
+    if stale:
+        tasks = [(source, settings, source_dir, output_dir, public_dir) for source in stale]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for source, entry, error in pool.map(render_variants, tasks):
+                url = public_url(source, public_dir)
+                if entry is None:
+                    # Not retried until the file changes
+                    unreadable[url] = {'mtime': os.path.getmtime(source), 'error': error}
+                else:
+                    images[url] = entry
+                    encoded += 1
+    elapsed = time.perf_counter() - started
+
+    # Variants of images that have gone, or of widths and formats no longer made
+    wanted = {Path(public_dir) / v['src'].lstrip('/') for entry in images.values()
+              for variants in entry['variants'].values() for v in variants}
+    removed = 0
+    for path in Path(output_dir).rglob('*'):
+        if path.is_file() and path not in wanted:
+            path.unlink()
+            removed += 1
+
+    categories = source_categories(source_dir, media_assets)
+    for source in sources:
+        entry = images.get(public_url(source, public_dir))
+        if entry:
+            entry['category'] = categories.get(source.parent.relative_to(source_dir).as_posix())
+            entry['srcset'] = {fmt: srcset(variants) for fmt, variants in entry['variants'].items()}
+    manifest = json.dumps({'settings': settings, 'images': dict(sorted(images.items())),
+                           'unreadable': dict(sorted(unreadable.items()))}, indent=1)
+    # Left alone when nothing changed, so re-runs don't dirty the checkout
+    if manifest != old_manifest:
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(manifest)
+        os.replace(tmp_path, manifest_path)
+
+    variants = [v for entry in images.values() for vs in entry['variants'].values() for v in vs]
+    return {'images': len(images), 'encoded': encoded, 'skipped': len(images) - encoded,
+            'unreadable': unreadable, 'removed': removed,
+            'variants': len(variants), 'seconds': elapsed,
+            'source_bytes': sum(entry['bytes'] for entry in images.values()),
+            'variant_bytes': sum(v['bytes'] for v in variants)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Make resized WebP/AVIF variants of the site's images")
+    parser.add_argument('--widths', default=','.join(map(str, DEFAULT_WIDTHS)),
+                        help="comma-separated breakpoint widths in pixels")
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                        help="comma-separated output formats (webp, avif)")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="encoding processes (default: one per CPU)")
+    parser.add_argument('--manifest', default=MANIFEST)
+    parser.add_argument('--force', action='store_true', help="re-encode every image")
+    args = parser.parse_args()
+
+    if Image is None:
+        raise SystemExit("Making image variants needs the Pillow package (pip install Pillow)")
+    stats = build_variants(widths=[int(w) for w in args.widths.split(',')],
+                           formats=args.formats.split(','), processes=args.processes,
+                           manifest_path=args.manifest, force=args.force)
+    for url, info in stats['unreadable'].items():
+        print(f"Unreadable {url}: {info['error']}")
+    mb = 1024 * 1024
+    print(f"{stats['images']} images: {stats['encoded']} encoded in {stats['seconds']:.1f}s, "
+          f"{stats['skipped']} already up to date, {len(stats['unreadable'])} unreadable; "
+          f"{stats['variants']} variants ({stats['variant_bytes'] / mb:.1f} MB, "
+          f"originals {stats['source_bytes'] / mb:.1f} MB), {stats['removed']} stale files removed")
+    print(f"Manifest: {args.manifest}")
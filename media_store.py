@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+# Content-addressed store for downloaded media. Every distinct file is kept
+# once, as blobs/<first two hex digits>/<sha256>, and each page's copy
+# (images/<page>/section_1_image_2.jpg) is a hard link to it, or a plain
+# copy where the filesystem can't link. manifest.json maps every page
+# file and source URL to its hash. Downloads in progress live in partial/
+# and are renamed into blobs/ once complete and verified.
+
+class MediaStore:
+    """Blobs named by SHA-256 plus a manifest of the files linked to them"""
+    def __init__(self, root='scraped-content/media-store'):
+        self.root = Path(root)
+        self.blobs_dir = self.root / 'blobs'
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.partial_dir = self.root / 'partial'
+        self.manifest_path = self.root / 'manifest.json'
+        self._lock = threading.Lock()
+        self.blobs = {}     # sha256 -> size
+        self.urls = {}      # source URL -> sha256
+        self.files = {}     # linked path -> sha256
+        self.linked = 0
+        self.copied = 0
+        self.stored = 0
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.blobs = manifest.get('blobs', {})
+            self.urls = manifest.get('urls', {})
+            self.files = manifest.get('files', {})
+
+    def blob_path(self, digest):
+        return self.blobs_dir / digest[:2] / digest
+
+    def part_path(self, url):
+        """Where url downloads to before it is complete (kept across runs for resuming)"""
+        self.partial_dir.mkdir(exist_ok=True)
+        return self.partial_dir / (hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + '.part')
+
+    def add_file(self, path, digest, size, url=None):
+        """Move a finished download (path, already hashed) in as a blob, unless
+        an identical blob exists; returns its sha256"""
+        blob = self.blob_path(digest)
+        with self._lock:
+            if url:
+                self.urls[url] = digest
+            if digest in self.blobs and blob.exists():
+                self.duplicates += 1
+                self.duplicate_bytes += size
+                duplicate = True
+            else:
+                self.blobs[digest] = size
+                self.stored += 1
+                duplicate = False
+        if duplicate:
+            os.remove(path)
+        else:
+            blob.parent.mkdir(exist_ok=True)
+            os.replace(path, blob)
+        return digest
+
+    def link(self, digest, target):
+        """Make target (a page's file) the blob's content: a hard link, else a copy"""
+        target = Path(target)
+        blob = self.blob_path(digest)
+        if target.exists():
+            if os.path.samefile(blob, target):
+                with self._lock:
+                    self.files[str(target)] = digest
+                    self.linked += 1
+                return
+            target.unlink()
+        try:
+            os.link(blob, target)
+            copied = False
+        except OSError:
+            shutil.copyfile(blob, target)
+            copied = True
+        with self._lock:
+            self.files[str(target)] = digest
+            if copied:
+                self.copied += 1
+            else:
+                self.linked += 1
+
+    def remove(self, target):
+        """Delete a page's file that is no longer used (its blob stays)"""
+        target = Path(target)
+        if target.exists():
+            target.unlink()
+        with self._lock:
+            self.files.pop(str(target), None)
+
+    def save(self):
+        with self._lock:
+            manifest = {'blobs': self.blobs, 'urls': self.urls, 'files': self.files}
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,89 @@
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# One scraped page per line: {"slug": ..., "page": {...}}. Every page is
+# flushed as it is written, so a crawl can be watched (or processed) while it
+# runs. A crawl killed mid-write leaves a torn last line, or a .gz / .zst
+# stream with no end marker; iter_pages reads up to the tear. Don't append
+# to such a file: a resumed crawl rewrites it from its checkpoint instead.
+
+# What reading past the end of a cut-off .gz or .zst stream raises
+TRUNCATED = (EOFError, zstandard.ZstdError) if zstandard else (EOFError,)
+SLUG_PREFIX = '{"slug": '
+
+def open_stream(path, mode):
+    """Open a .jsonl / .jsonl.gz / .jsonl.zst file in text mode ('r' or 'w')"""
+    path = str(path)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Reading or writing .zst files needs the zstandard package "
+                               "(pip install zstandard)")
+        return zstandard.open(path, mode + 't', encoding='utf-8')
+
+    return open(path, mode, encoding='utf-8')
+
+class PageStreamWriter:
+    """Write scraped pages to a JSONL file as they are produced"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open_stream(path, 'w')
+        self.count = 0
+
+    def write(self, slug, page_data):
+        self.file.write(json.dumps({'slug': slug, 'page': page_data}, ensure_ascii=False) + '\n')
+        # Flush every page so the file is usable even if the crawl dies
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+def iter_pages(path):
+    """Yield (slug, page_data) from a page stream, or from a legacy all_pages.json"""
+    path = str(path)
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f).items()
+        return
+
+    # Two URLs can share a slug; as in the .json output and the checkpoint,
+    # the last copy wins (a resumed crawl's re-fetch replaces the stale one)
+    last = {}
+    for index, line in enumerate(complete_lines(path)):
+        try:
+            last[line_slug(line)] = index
+        except ValueError:
+            continue
+    for index, line in enumerate(complete_lines(path)):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if last.get(record['slug']) == index:
+            yield record['slug'], record['page']
+
+def complete_lines(path):
+    """Non-empty lines of a page stream, stopping at the tear a killed crawl leaves"""
+    with open_stream(path, 'r') as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield line
+        except TRUNCATED:
+            # Every page flushed before the crawl died has been read
+            pass
+
+def line_slug(line):
+    """A record's slug, read without decoding the page after it"""
+    if line.startswith(SLUG_PREFIX) and line.endswith('\n'):
+        return json.JSONDecoder().raw_decode(line, len(SLUG_PREFIX))[0]
+    # A torn last line has no newline, and fails here like it will on the full read
+    return json.loads(line)['slug']
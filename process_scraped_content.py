@@ -1,24 +1,58 @@
+import argparse
+import hashlib
 import json
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin, urlparse
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from media_store import MediaStore
+from page_stream import iter_pages
+from resumable_download import download
 
 class ContentProcessor:
-    def __init__(self, scraped_data_file):
-        with open(scraped_data_file, 'r', encoding='utf-8') as f:
-            self.scraped_data = json.load(f)
+    def __init__(self, scraped_data_file, max_workers=8, max_per_host=4):
+        # Pages are read lazily, one at a time, from the scraper's output
+        self.scraped_data_file = scraped_data_file
         
         self.content_dir = Path('scraped-content/content')
         self.images_dir = Path('scraped-content/images')
         self.content_dir.mkdir(exist_ok=True)
         self.images_dir.mkdir(exist_ok=True)
         
+        # Images are downloaded up front by max_workers threads sharing one
+        # keep-alive session, at most max_per_host at a time from one host
+        self.max_workers = max(1, max_workers)
+        self.max_per_host = max(1, max_per_host)
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+        self.downloaded = {}
+        
+        # Each distinct image is downloaded once per run and stored once;
+        # every page's copy is a hard link to the stored file
+        self.store = MediaStore()
+        self.url_digests = {}  # URL -> sha256, or None if it failed this run
+        self.refetch = True    # False: trust images stored by earlier runs
+        self.fetches = 0
+        self.bytes_downloaded = 0
+        
+        # What each page was last built from, so unchanged pages are skipped
+        self.build_manifest_path = Path('scraped-content/metadata/build_manifest.json')
+        
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        # Resumed and retried downloads take more than one request
+        self.session.hooks['response'].append(self.count_fetch)
     
     def sanitize_filename(self, name):
         """Create safe filename"""
@@ -26,6 +60,44 @@ class ContentProcessor:
         name = re.sub(r'[-\s]+', '-', name)
         return name[:100]  # Limit length
     
+    def count_fetch(self, response, *args, **kwargs):
+        with self._host_lock:
+            self.fetches += 1
+    
+    @contextmanager
+    def host_slot(self, url):
+        """Hold one of the max_per_host download slots for url's host"""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            slots = self._host_slots.get(host)
+            if slots is None:
+                slots = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+        with slots:
+            yield
+    
+    def fetch_image(self, img_url):
+        """Download an image into the media store once per run; returns its sha256 or None"""
+        if img_url in self.url_digests:
+            return self.url_digests[img_url]
+        digest = self.store.urls.get(img_url)
+        if not self.refetch and digest and self.store.blob_path(digest).exists():
+            self.url_digests[img_url] = digest
+            return digest
+        digest = None
+        try:
+            # Streamed to a part file that survives for the next run if this one
+            # fails; checked, then renamed into the store
+            part_path = self.store.part_path(img_url)
+            with self.host_slot(img_url):
+                digest, size, received = download(self.session, img_url, part_path)
+            with self._host_lock:
+                self.bytes_downloaded += received
+            self.store.add_file(part_path, digest, size, img_url)
+        except Exception as e:
+            print(f"Error downloading {img_url}: {str(e)}")
+        self.url_digests[img_url] = digest
+        return digest
+    
     def download_image(self, img_url, page_slug, section_index, img_index, img_type='image'):
         """Download and save image with proper naming"""
         try:
@@ -43,12 +115,10 @@ class ContentProcessor:
             filename = f"section_{section_index}_{img_type}_{img_index}{ext}"
             filepath = page_dir / filename
             
-            # Download image
-            response = self.session.get(img_url, timeout=10)
-            response.raise_for_status()
-            
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            digest = self.fetch_image(img_url)
+            if digest is None:
+                return None
+            self.store.link(digest, filepath)
             
             print(f"Downloaded: {filename}")
             return str(filepath.relative_to('scraped-content'))
@@ -57,7 +127,104 @@ class ContentProcessor:
             print(f"Error downloading {img_url}: {str(e)}")
             return None
     
-    def process_section_content(self, section, page_slug):
+    def iter_pages(self):
+        """Yield (slug, page_data) without loading the whole file"""
+        return iter_pages(self.scraped_data_file)
+    
+    def image_jobs(self, page_slug, page_data):
+        """download_image arguments for every section image of a page, in render order"""
+        jobs = []
+        for section in page_data['sections']:
+            for idx, img in enumerate(section.get('images') or [], 1):
+                img_url = img['src']
+                if not img_url.startswith('http'):
+                    img_url = urljoin(page_data['url'], img_url)
+                jobs.append((img_url, page_slug, section['index'], idx, 'image'))
+        return jobs
+    
+    def download_images(self, jobs):
+        """Download every distinct image on the thread pool, then give each job its
+        file; returns {job: local path or None}"""
+        if not jobs:
+            return {}
+        started = time.perf_counter()
+        urls = list(dict.fromkeys(job[0] for job in jobs))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(self.fetch_image, urls))
+        results = {job: self.download_image(*job) for job in jobs}
+        elapsed = time.perf_counter() - started
+        ok = sum(1 for path in results.values() if path)
+        print(f"Downloaded {ok} of {len(jobs)} images in {elapsed:.1f}s "
+              f"({self.max_workers} threads, {self.max_per_host} per host)")
+        return results
+    
+    def media_summary(self):
+        """Requests and bytes the media store saved this run"""
+        store = self.store
+        sizes = {url: store.blobs.get(digest, 0) for url, digest in self.url_digests.items()
+                 if digest is not None}
+        # Bytes every page image would have cost, less each URL downloaded once
+        not_downloaded = sum(sizes.get(job[0], 0) for job, path in self.downloaded.items()
+                             if path) - sum(sizes.values())
+        saved = not_downloaded + store.duplicate_bytes
+        mb = 1024 * 1024
+        return (f"Media store: {len(self.downloaded)} page images from {self.fetches} requests "
+                f"({len(self.downloaded) - self.fetches} saved), "
+                f"{self.bytes_downloaded / mb:.1f} MB downloaded; "
+                f"{not_downloaded / mb:.1f} MB not downloaded again, "
+                f"{store.duplicates} downloads matched a stored file "
+                f"({store.duplicate_bytes / mb:.1f} MB not stored twice), "
+                f"{saved / mb:.1f} MB saved in all; {store.linked} hard links"
+                + (f", {store.copied} copies" if store.copied else ""))
+    
+    def page_hashes(self, page_slug, page_data):
+        """(hash of the page's data, hash of its media URLs and their places, its image jobs)"""
+        # A re-crawl stamps every page with a new scraped_at; that alone isn't a change
+        data = {key: value for key, value in page_data.items() if key != 'scraped_at'}
+        data_hash = hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+        jobs = self.image_jobs(page_slug, page_data)
+        media = '\n'.join(f"{job[2]} {job[3]} {job[0]}" for job in jobs)
+        media_hash = hashlib.sha256(media.encode('utf-8')).hexdigest()
+        return data_hash, media_hash, jobs
+    
+    def load_build_manifest(self):
+        """{slug: {'data', 'media', 'images'}} from the last run, or {}"""
+        if not self.build_manifest_path.exists():
+            return {}
+        with open(self.build_manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('pages', {})
+    
+    def save_build_manifest(self, pages):
+        tmp_path = self.build_manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': pages}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.build_manifest_path)
+    
+    def outputs_exist(self, page_slug, entry):
+        """Whether a page's markdown and images from the last run are all still there.
+        
+        An image that failed to download (None) counts as missing, so it is retried."""
+        if None in entry['images']:
+            return False
+        paths = [Path('scraped-content') / path for path in entry['images']]
+        return (self.content_dir / f"{page_slug}.md").exists() and all(p.exists() for p in paths)
+    
+    def remove_outputs(self, page_slug, entry, keep=(), markdown=True):
+        """Delete a page's markdown (if markdown) and its images not in keep;
+        returns how many files went"""
+        removed = 0
+        if markdown and (self.content_dir / f"{page_slug}.md").exists():
+            (self.content_dir / f"{page_slug}.md").unlink()
+            removed += 1
+        for path in set(entry['images']) - set(keep) - {None}:
+            self.store.remove(Path('scraped-content') / path)
+            removed += 1
+        page_dir = self.images_dir / page_slug
+        if page_dir.exists() and not any(page_dir.iterdir()):
+            page_dir.rmdir()
+        return removed
+    
+    def process_section_content(self, section, page_slug, page_url):
         """Process a section and download its media"""
         markdown_content = []
         
@@ -78,12 +245,14 @@ class ContentProcessor:
                 img_url = img['src']
                 if not img_url.startswith('http'):
                     # Handle relative URLs
-                    img_url = urljoin(self.scraped_data[page_slug]['url'], img_url)
+                    img_url = urljoin(page_url, img_url)
                 
-                # Download image
-                local_path = self.download_image(
-                    img_url, page_slug, section['index'], idx, 'image'
-                )
+                # Downloaded up front by process_all
+                job = (img_url, page_slug, section['index'], idx, 'image')
+                if job in self.downloaded:
+                    local_path = self.downloaded[job]
+                else:
+                    local_path = self.download_image(*job)
                 
                 if local_path:
                     alt_text = img.get('alt', f"Image {idx}")
@@ -129,7 +298,7 @@ class ContentProcessor:
         
         # Process sections
         for section in page_data['sections']:
-            section_content = self.process_section_content(section, page_slug)
+            section_content = self.process_section_content(section, page_slug, page_data['url'])
             markdown_lines.append(section_content)
             markdown_lines.append("\n---\n")
         
@@ -145,7 +314,7 @@ class ContentProcessor:
         index_content = ["# Scraped Content Index\n"]
         index_content.append("## Pages\n")
         
-        for page_slug, page_data in self.scraped_data.items():
+        for page_slug, page_data in self.iter_pages():
             index_content.append(f"### [{page_data['title']}](content/{page_slug}.md)")
             index_content.append(f"- URL: {page_data['url']}")
             index_content.append(f"- Sections: {len(page_data['sections'])}")
@@ -157,18 +326,79 @@ class ContentProcessor:
         with open('scraped-content/INDEX.md', 'w', encoding='utf-8') as f:
             f.write("\n".join(index_content))
     
-    def process_all(self):
-        """Process all scraped data"""
+    def process_all(self, full=False):
+        """Process the pages that changed since the last run (all of them if full)"""
         print("Processing scraped content...")
+        started = time.perf_counter()
+        previous = self.load_build_manifest()
+        # Only new image URLs are downloaded, unless rebuilding in full
+        self.refetch = full
+        
+        # Pages whose data, media URLs and outputs are unchanged are skipped.
+        # Pages where only the text changed keep the images already on disk;
+        # the rest have their images collected so they download in parallel
+        pages = {}
+        changed = {}
+        jobs = []
+        for page_slug, page_data in self.iter_pages():
+            data_hash, media_hash, page_jobs = self.page_hashes(page_slug, page_data)
+            old = None if full else previous.get(page_slug)
+            if old and old['data'] == data_hash and old['media'] == media_hash \
+                    and self.outputs_exist(page_slug, old):
+                pages[page_slug] = old
+                continue
+            if old and old['media'] == media_hash and self.outputs_exist(page_slug, old):
+                self.downloaded.update(zip(page_jobs, old['images']))
+            else:
+                jobs.extend(page_jobs)
+            pages[page_slug] = {'data': data_hash, 'media': media_hash}
+            changed[page_slug] = page_jobs
+        self.downloaded.update(self.download_images(jobs))
         
-        for page_slug, page_data in self.scraped_data.items():
-            print(f"\nProcessing: {page_slug}")
-            self.create_markdown_file(page_slug, page_data)
+        for page_slug, page_data in self.iter_pages():
+            if page_slug in changed:
+                print(f"\nProcessing: {page_slug}")
+                self.create_markdown_file(page_slug, page_data)
+                pages[page_slug]['images'] = [self.downloaded.get(job) for job in changed[page_slug]]
         
-        self.create_index_file()
+        # Images a changed page no longer uses, and everything of pages that are gone
+        removed = 0
+        for page_slug, entry in previous.items():
+            if page_slug not in pages:
+                removed += self.remove_outputs(page_slug, entry)
+            elif page_slug in changed:
+                removed += self.remove_outputs(page_slug, entry, keep=pages[page_slug]['images'],
+                                               markdown=False)
+        
+        if changed or removed or not Path('scraped-content/INDEX.md').exists():
+            self.create_index_file()
+            self.store.save()
+            self.save_build_manifest(pages)
+        elapsed = time.perf_counter() - started
+        unchanged = len(pages) - len(changed)
+        if jobs:
+            print(self.media_summary())
+        print(f"\n{len(changed)} pages rebuilt, {unchanged} unchanged, {removed} stale files removed "
+              f"in {elapsed:.2f}s ({self.fetches} requests)")
         print("\nProcessing complete!")
 
 # Run processor
 if __name__ == "__main__":
-    processor = ContentProcessor('scraped-content/metadata/all_pages.json')
-    processor.process_all()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Turn scraped pages into markdown and images")
+    parser.add_argument('input', nargs='?', default='scraped-content/metadata/all_pages.jsonl',
+                        help="scraper output (.jsonl, .jsonl.gz, .jsonl.zst or legacy .json)")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="images downloaded in parallel")
+    parser.add_argument('--per-host', type=int, default=4,
+                        help="maximum parallel downloads from one host")
+    parser.add_argument('--full', action='store_true',
+                        help="rebuild every page, not just the ones that changed")
+    args = parser.parse_args()
+    
+    input_file = args.input
+    legacy_file = 'scraped-content/metadata/all_pages.json'
+    if not os.path.exists(input_file) and os.path.exists(legacy_file):
+        input_file = legacy_file
+    
+    processor = ContentProcessor(input_file, max_workers=args.workers, max_per_host=args.per_host)
+    processor.process_all(full=args.full)
\ No newline at end of file
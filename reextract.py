@@ -0,0 +1,97 @@
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+from requests.utils import get_encoding_from_headers
+
+import scraper
+from fingerprints import DEFAULT_RULES_FILE
+from html_backends import PARSER_BACKENDS
+from page_stream import PageStreamWriter
+from warc_archive import iter_responses, read_base_url
+
+# Re-run the parsing stage of scraper.py over a response archive written with
+# --archive: no network, every core busy. Change extract_sections or the
+# fingerprint rules, then rebuild all_pages.jsonl in seconds instead of
+# re-crawling the site.
+
+def latest_responses(path):
+    """Yield the newest successful response for each URL, in archive order"""
+    newest = {}
+    for index, (url, status_code, _, _) in enumerate(iter_responses(path)):
+        if 200 <= status_code < 300:
+            newest[url] = index
+    for index, (url, _, headers, body) in enumerate(iter_responses(path)):
+        if newest.get(url) == index:
+            yield url, body, headers, get_encoding_from_headers(headers)
+
+def reextract(archive_path, output_path, processes=None, parser_backend='lxml',
+              fingerprints_file=DEFAULT_RULES_FILE, base_url=None):
+    """Parse every archived page again and write them to output_path; returns the page count"""
+    base_url = base_url or read_base_url(archive_path)
+    if base_url is None:
+        first = next(iter_responses(archive_path), None)
+        if first is None:
+            raise ValueError(f"{archive_path} holds no responses")
+        parsed = urlparse(first[0])
+        base_url = f"{parsed.scheme}://{parsed.netloc}/"
+
+    namer = scraper.WebsiteScraper(base_url, parser_backend=parser_backend,
+                                   fingerprints_file=fingerprints_file)
+    output = PageStreamWriter(output_path)
+    initargs = (base_url, parser_backend, str(fingerprints_file))
+
+    def write(url, result):
+        page_data, _, _ = result
+        output.write(namer.create_slug(url), page_data)
+
+    if processes == 0:
+        scraper.init_parse_worker(*initargs)
+        for url, body, headers, encoding in latest_responses(archive_path):
+            write(url, scraper.parse_raw_page(url, body, headers, encoding))
+    else:
+        processes = processes or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=processes, initializer=scraper.init_parse_worker,
+                                 initargs=initargs) as pool:
+            # A bounded window keeps memory flat on big archives and the
+            # output in archive order
+            window = 4 * processes
+            pending = deque()
+            for url, body, headers, encoding in latest_responses(archive_path):
+                pending.append((url, pool.submit(scraper.parse_raw_page, url, body, headers,
+                                                 encoding)))
+                if len(pending) >= window:
+                    url, future = pending.popleft()
+                    write(url, future.result())
+            while pending:
+                url, future = pending.popleft()
+                write(url, future.result())
+    output.close()
+    return output.count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-parse a scraper.py --archive file without the network")
+    parser.add_argument('archive', help="WARC file written by scraper.py --archive")
+    parser.add_argument('--output', default='scraped-content/metadata/all_pages.jsonl',
+                        help="where the pages go (.jsonl, .jsonl.gz or .jsonl.zst)")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help="parse processes (0 parses in this process)")
+    parser.add_argument('--parser', choices=PARSER_BACKENDS, default='lxml',
+                        help="HTML parser backend (lexbor needs selectolax installed)")
+    parser.add_argument('--fingerprints', default=str(DEFAULT_RULES_FILE),
+                        help="technology rules file")
+    parser.add_argument('--base-url', default=None,
+                        help="site start URL (default: the one recorded in the archive)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    count = reextract(args.archive, args.output, processes=args.processes,
+                      parser_backend=args.parser, fingerprints_file=args.fingerprints,
+                      base_url=args.base_url)
+    elapsed = time.perf_counter() - started
+    print(f"Re-extracted {count} pages from {args.archive} in {elapsed:.2f}s "
+          f"({count / elapsed if elapsed else 0:.1f} pages/sec, "
+          f"{args.processes or 'no'} parse processes) into {args.output}")
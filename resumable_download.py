@@ -0,0 +1,137 @@
+import base64
+import hashlib
+import json
+import os
+import re
+
+import requests
+
+# Streamed, resumable downloads for large media. The body goes to disk in
+# 64 KB chunks, so memory stays flat however big the file. If the connection
+# drops, the partial file is kept and the next attempt (in this run or a
+# later one) asks for the rest with a Range request. If-Range, with the
+# ETag or Last-Modified the first response carried, makes a server that
+# has changed the file send all of it again instead of a mismatched tail.
+#
+# The result is checked against Content-Length (or the total in
+# Content-Range) and, when the server sends one, a SHA-256 or MD5 digest
+# of the whole file (Repr-Digest, RFC 9530, or the older Digest header).
+
+READ_CHUNK = 64 * 1024
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError)
+
+_CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+_UNSATISFIED_RANGE = re.compile(r'bytes\s+\*/(\d+)')
+_DIGEST_ALGORITHMS = {'sha-256': 'sha256', 'md5': 'md5'}
+
+class DownloadError(Exception):
+    pass
+
+def expected_digests(headers):
+    """{hashlib name: expected hex digest} from Repr-Digest / Digest headers"""
+    expected = {}
+    for header in ('Repr-Digest', 'Digest'):
+        for item in headers.get(header, '').split(','):
+            name, _, value = item.strip().partition('=')
+            algorithm = _DIGEST_ALGORITHMS.get(name.strip().lower())
+            if algorithm and value and algorithm not in expected:
+                try:
+                    expected[algorithm] = base64.b64decode(value.strip().strip(':')).hex()
+                except ValueError:
+                    pass
+    return expected
+
+def _hash_file(path, algorithms):
+    hashers = {name: hashlib.new(name) for name in algorithms}
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            for hasher in hashers.values():
+                hasher.update(chunk)
+    return hashers
+
+def _read_meta(meta_path, url):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return meta if meta.get('url') == url else {}
+
+def download(session, url, part_path, timeout=10, attempts=3, chunk_size=READ_CHUNK):
+    """Stream url into part_path, resuming what is already there.
+
+    Returns (sha256 hex, size, bytes received this call); raises
+    DownloadError (or requests.HTTPError) if the file can't be completed."""
+    part_path = str(part_path)
+    meta_path = part_path + '.json'
+    received = 0
+    last_error = None
+    for _ in range(attempts):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        meta = _read_meta(meta_path, url) if offset else {}
+        # Compressed transfers can't be resumed or checked against Content-Length
+        headers = {'Accept-Encoding': 'identity'}
+        if offset and meta.get('validator'):
+            headers['Range'] = f"bytes={offset}-"
+            headers['If-Range'] = meta['validator']
+        else:
+            offset = 0
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416 and offset:
+                    # Nothing left to send: the part may already be whole
+                    match = _UNSATISFIED_RANGE.match(response.headers.get('Content-Range', ''))
+                    if match and int(match.group(1)) == offset:
+                        expected = meta.get('expected', {})
+                        size = offset
+                        break
+                    os.remove(part_path)
+                    continue
+                response.raise_for_status()
+
+                expected = expected_digests(response.headers)
+                if response.status_code == 206:
+                    match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+                    if not match or int(match.group(1)) != offset:
+                        os.remove(part_path)
+                        continue
+                    total = None if match.group(3) == '*' else int(match.group(3))
+                    # The first response's digests cover the whole file too
+                    expected = expected or meta.get('expected', {})
+                    mode = 'ab'
+                else:
+                    length = response.headers.get('Content-Length', '')
+                    encoded = response.headers.get('Content-Encoding', 'identity') != 'identity'
+                    total = int(length) if length.isdigit() and not encoded else None
+                    mode = 'wb'
+
+                validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'url': url, 'validator': validator, 'expected': expected}, f)
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        received += len(chunk)
+        except RETRY_ERRORS as e:
+            # Keep what arrived; the next attempt asks for the rest
+            last_error = e
+            continue
+
+        size = os.path.getsize(part_path)
+        if total is not None and size != total:
+            last_error = DownloadError(f"got {size} of {total} bytes")
+            continue
+        break
+    else:
+        raise DownloadError(f"gave up after {attempts} attempts: {last_error}")
+
+    hashers = _hash_file(part_path, {'sha256'} | set(expected))
+    for algorithm, digest in expected.items():
+        if hashers[algorithm].hexdigest() != digest:
+            os.remove(part_path)
+            os.remove(meta_path)
+            raise DownloadError(f"{algorithm} mismatch: the server promised {digest}")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    return hashers['sha256'].hexdigest(), size, received
@@ -1,32 +1,534 @@
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
 import os
 import json
 import time
+import argparse
+import sqlite3
+import threading
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 import hashlib
 import re
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from page_stream import PageStreamWriter
+from charsets import decode_html
+from crawl_metrics import CrawlMetrics
+from html_backends import PARSER_BACKENDS, parse_html
+from fingerprints import DEFAULT_RULES_FILE, Fingerprinter
+from frontier import CrawlFrontier, parse_lastmod
+from url_sets import VISITED_SET_KINDS, describe_memory, make_visited_set
+from warc_archive import WarcWriter
+from wordpress_api import WordPressAPI
+
+def build_response(url, content, headers, encoding=None, status_code=200):
+    """Rebuild a requests.Response from stored bytes and headers"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = encoding
+    response._content = content
+    return response
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+def make_session(pool_connections=10, pool_maxsize=10):
+    """requests session with the scraper's User-Agent and a sized connection pool"""
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Responses that mean "slow down": the URL is retried later, not dropped
+THROTTLE_STATUSES = (429, 503)
+
+class Throttled(Exception):
+    """The server asked us to back off (429/503); the URL should be re-queued"""
+    def __init__(self, url, status_code):
+        super().__init__(f"{status_code} from {url}")
+        self.url = url
+        self.status_code = status_code
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+# Bodies are streamed in and checked before they are kept: anything that is
+# not HTML, or bigger than max_page_bytes, is abandoned as early as possible
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+UNTYPED_CONTENT_TYPES = ('', 'application/octet-stream')
+# URL extensions that are normally pages; anything else gets a HEAD first
+# with head_probe='auto'
+PAGE_EXTENSIONS = ('', '.html', '.htm', '.xhtml', '.shtml', '.php', '.asp', '.aspx', '.jsp', '.cfm')
+HEAD_PROBE_MODES = ('off', 'auto', 'always')
+READ_CHUNK = 64 * 1024
+# Stands in for a URL in the crawl loops while the REST API pass is in flight
+WORDPRESS_API = 'wordpress-api'
+
+class SkippedDownload(Exception):
+    """A response given up on before or while reading its body"""
+    def __init__(self, url, reason, detail, status_code=None, wasted=0):
+        super().__init__(f"{detail} ({url})")
+        self.url = url
+        self.reason = reason        # 'not html' or 'too large'
+        self.detail = detail
+        self.status_code = status_code
+        self.wasted = wasted        # body bytes read before giving up
+
+def sniff_html(prefix):
+    """Guess whether the first bytes of an untyped body are HTML"""
+    head = prefix[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if b'\x00' in head:
+        return False
+    return head.startswith((b'<!doctype html', b'<html', b'<head', b'<body', b'<!--',
+                            b'<meta', b'<title', b'<div', b'<p', b'<script', b'<link'))
+
+class HostThrottle:
+    """Per-host concurrency cap and minimum delay between request starts"""
+    MAX_BACKOFF = 300.0
+    
+    def __init__(self, max_per_host=2, min_delay=1.0):
+        self.max_per_host = max_per_host
+        self.min_delay = min_delay
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._host_delay = {}  # longer delays asked for by one host (robots.txt Crawl-delay)
+        self._next_start = {}
+        self._paused_until = {}
+        self._throttle_streak = {}
+    
+    @contextmanager
+    def limit(self, url):
+        """Hold a request slot for the URL's host, waiting out the delay"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            slot = self._slots[host]
+        
+        with slot:
+            # Reserve the next start time for this host before sleeping so
+            # waiting threads queue up behind each other instead of bunching
+            with self._lock:
+                now = time.monotonic()
+                start = max(self._reserve(host, now), self._paused_until.get(host, now))
+            if start > now:
+                time.sleep(start - now)
+            yield
+    
+    def _reserve(self, host, now):
+        """Pick the earliest start for the next request to host (lock held)"""
+        start = self._earliest_start(host, now)
+        self._next_start[host] = start + max(self.min_delay, self._host_delay.get(host, 0.0))
+        return start
+    
+    def _earliest_start(self, host, now):
+        return max(now, self._next_start.get(host, now))
+    
+    def ready_in(self, url):
+        """Seconds until a new request to the URL's host could start (0 if now)"""
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._earliest_start(host, now), self._paused_until.get(host, now))
+        return start - now
+    
+    def feedback(self, url, status_code, latency, retry_after=None):
+        """Pause a host that answered 429/503, for Retry-After if it sent one"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if status_code not in THROTTLE_STATUSES:
+                self._throttle_streak[host] = 0
+                return
+            streak = self._throttle_streak.get(host, 0) + 1
+            self._throttle_streak[host] = streak
+            pause = retry_after if retry_after is not None else 2.0 ** streak
+            pause = min(pause, self.MAX_BACKOFF)
+            resume_at = time.monotonic() + pause
+            self._paused_until[host] = max(self._paused_until.get(host, 0.0), resume_at)
+        print(f"{host} returned {status_code}; pausing it for {pause:.1f}s")
+    
+    def set_min_delay(self, min_delay, host=None):
+        """Change the delay for every host, or for just one"""
+        if host is None:
+            self.min_delay = min_delay
+        else:
+            with self._lock:
+                self._host_delay[host] = min_delay
+    
+    def summary(self):
+        return f"Request spacing: fixed {self.min_delay}s per host"
+
+class AdaptiveThrottle(HostThrottle):
+    """Token bucket per host whose refill rate follows the server's health.
+    
+    Healthy responses raise the rate additively (up to max_rate, and never
+    above 1 / min_delay); a 429/503 halves it and rising latency trims it."""
+    def __init__(self, max_per_host=2, min_delay=0.0, start_rate=2.0, min_rate=0.1,
+                 max_rate=10.0, burst=1.0, increase=0.25, slow_factor=2.0):
+        super().__init__(max_per_host=max_per_host, min_delay=min_delay)
+        if min_delay > 0:
+            max_rate = min(max_rate, 1.0 / min_delay)
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.start_rate = min(start_rate, max_rate)
+        self.burst = burst
+        self.increase = increase
+        self.slow_factor = slow_factor
+        self._buckets = {}
+    
+    def set_min_delay(self, min_delay, host=None):
+        super().set_min_delay(min_delay, host)
+        if min_delay <= 0:
+            return
+        with self._lock:
+            if host is None:
+                self.max_rate = min(self.max_rate, 1.0 / min_delay)
+                self.min_rate = min(self.min_rate, self.max_rate)
+                self.start_rate = min(self.start_rate, self.max_rate)
+                buckets = self._buckets.values()
+            else:
+                buckets = [self._bucket(host)]
+            for bucket in buckets:
+                bucket['max_rate'] = min(bucket['max_rate'], 1.0 / min_delay)
+                bucket['rate'] = min(bucket['rate'], bucket['max_rate'])
+    
+    def _bucket(self, host):
+        if host not in self._buckets:
+            self._buckets[host] = {'rate': self.start_rate, 'max_rate': self.max_rate,
+                                   'tokens': self.burst, 'updated': time.monotonic(),
+                                   'latency': None, 'baseline': None}
+        return self._buckets[host]
+    
+    def _earliest_start(self, host, now):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            return now
+        tokens = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+        if tokens >= 1:
+            return now
+        return now + (1 - tokens) / bucket['rate']
+    
+    def _reserve(self, host, now):
+        bucket = self._bucket(host)
+        bucket['tokens'] = min(self.burst,
+                               bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+        bucket['updated'] = now
+        # Tokens may go negative: that debt is the queue of waiting requests
+        bucket['tokens'] -= 1
+        if bucket['tokens'] >= 0:
+            return now
+        return now - bucket['tokens'] / bucket['rate']
+    
+    def feedback(self, url, status_code, latency, retry_after=None):
+        super().feedback(url, status_code, latency, retry_after)
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self._bucket(host)
+            if status_code in THROTTLE_STATUSES:
+                bucket['rate'] = max(min(self.min_rate, bucket['max_rate']), bucket['rate'] / 2)
+                bucket['tokens'] = min(bucket['tokens'], 0.0)
+                return
+            
+            if bucket['latency'] is None:
+                bucket['latency'] = bucket['baseline'] = latency
+            else:
+                bucket['latency'] = 0.8 * bucket['latency'] + 0.2 * latency
+                # Let the baseline drift up slowly so one lucky fast
+                # response doesn't make every later one look slow
+                bucket['baseline'] = min(bucket['baseline'] * 1.01, bucket['latency'])
+            
+            if bucket['latency'] > self.slow_factor * bucket['baseline']:
+                bucket['rate'] = max(min(self.min_rate, bucket['max_rate']), bucket['rate'] * 0.8)
+            else:
+                bucket['rate'] = min(bucket['max_rate'], bucket['rate'] + self.increase)
+    
+    def summary(self):
+        with self._lock:
+            rates = ', '.join(f"{host} {bucket['rate']:.2f}/s"
+                              for host, bucket in self._buckets.items())
+        return f"Adaptive request rate at finish: {rates or 'no requests'}"
+
+# Headers a 304 may update on the cached response (RFC 9111, section 4.3.4)
+REVALIDATED_HEADERS = ('ETag', 'Last-Modified', 'Date', 'Expires', 'Cache-Control')
+
+class ResponseCache:
+    """On-disk page cache keyed by normalized URL, revalidated with conditional GETs"""
+    def __init__(self, cache_dir='scraped-content/cache'):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+    
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        entry_dir = self.cache_dir / key[:2]
+        return entry_dir / f"{key}.json", entry_dir / f"{key}.body"
+    
+    def conditional_headers(self, url):
+        """Build If-None-Match / If-Modified-Since headers for a cached URL"""
+        meta_path, body_path = self._paths(url)
+        if not (meta_path.exists() and body_path.exists()):
+            return {}
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+    
+    def revalidated(self, url, response):
+        """Turn a 304 into a 200 response carrying the cached body"""
+        meta_path, body_path = self._paths(url)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        body = body_path.read_bytes()
+        
+        # Only validators and freshness: a 304's Content-Length: 0 or
+        # Transfer-Encoding would not describe the cached body
+        headers = dict(meta.get('headers', {}))
+        for name in REVALIDATED_HEADERS:
+            if name in response.headers:
+                headers[name] = response.headers[name]
+        cached = build_response(response.url, body, headers, meta.get('encoding'))
+        
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(body)
+        return cached
+    
+    def store(self, url, response):
+        """Save a full response if the server gave us a validator to reuse it"""
+        with self._lock:
+            self.misses += 1
+        
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not (etag or last_modified):
+            return
+        
+        meta_path, body_path = self._paths(url)
+        meta_path.parent.mkdir(exist_ok=True)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'encoding': response.encoding,
+            'headers': {'Content-Type': response.headers.get('Content-Type', '')},
+            'stored_at': datetime.now().isoformat()
+        }
+        # Write to temp files first so a crash never leaves a half-written entry
+        tmp_body = body_path.with_suffix('.body.tmp')
+        tmp_body.write_bytes(response.content)
+        os.replace(tmp_body, body_path)
+        tmp_meta = meta_path.with_suffix('.json.tmp')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+    
+    def summary(self):
+        return (f"Cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.bytes_saved / 1024:.1f} KB saved")
+
+class CrawlCheckpoint:
+    """SQLite record of the frontier, finished URLs and scraped pages"""
+    def __init__(self, db_path='scraped-content/metadata/crawl.sqlite3'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS crawl (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS frontier (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                 url TEXT UNIQUE, depth INTEGER,
+                                                 priority REAL);
+            CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS pages (slug TEXT PRIMARY KEY, url TEXT, data TEXT);
+        """)
+        # Checkpoints from before the priority frontier have no depth/priority
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(frontier)')]
+        if 'priority' not in columns:
+            self.conn.execute('ALTER TABLE frontier ADD COLUMN depth INTEGER')
+            self.conn.execute('ALTER TABLE frontier ADD COLUMN priority REAL')
+        self.conn.commit()
+    
+    def start(self, base_url):
+        """Forget any previous crawl and record the new base URL"""
+        with self._lock, self.conn:
+            for table in ('crawl', 'frontier', 'visited', 'pages'):
+                self.conn.execute(f'DELETE FROM {table}')
+            self.conn.execute('INSERT INTO crawl VALUES (?, ?)', ('base_url', base_url))
+    
+    def load(self, base_url, with_pages=True):
+        """Return (frontier, visited, scraped_data) saved for base_url.
+        
+        frontier is a list of (url, depth, priority) still to fetch."""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM crawl WHERE key = 'base_url'").fetchone()
+            if not row or row[0] != base_url:
+                raise ValueError(f"{self.db_path} does not hold a crawl of {base_url}")
+            
+            visited = {url for (url,) in self.conn.execute('SELECT url FROM visited')}
+            frontier = [(url, depth or 0, priority if priority is not None else 0.5)
+                        for url, depth, priority in self.conn.execute(
+                            'SELECT url, depth, priority FROM frontier ORDER BY seq')
+                        if url not in visited]
+            scraped_data = {}
+            if with_pages:
+                scraped_data = {slug: json.loads(data) for slug, data in
+                                self.conn.execute('SELECT slug, data FROM pages ORDER BY rowid')}
+        return frontier, visited, scraped_data
+    
+    def iter_pages(self):
+        """Yield (slug, page_data) for every saved page, in the order they finished"""
+        with self._lock:
+            for slug, data in self.conn.execute('SELECT slug, data FROM pages ORDER BY rowid'):
+                yield slug, json.loads(data)
+    
+    def page_count(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+    
+    def add_to_frontier(self, url, depth=0, priority=0.5):
+        with self._lock, self.conn:
+            self.conn.execute('INSERT INTO frontier (url, depth, priority) VALUES (?, ?, ?) '
+                              'ON CONFLICT(url) DO UPDATE SET depth = excluded.depth, '
+                              'priority = excluded.priority', (url, depth, priority))
+    
+    def finish(self, url, slug=None, page_data=None):
+        """Record a URL as done (and its page, if any) in one transaction"""
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO visited VALUES (?)', (url,))
+            self.conn.execute('DELETE FROM frontier WHERE url = ?', (url,))
+            if page_data is not None:
+                self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?)',
+                                  (slug, url, json.dumps(page_data, ensure_ascii=False)))
+    
+    def close(self):
+        self.conn.close()
 
 class WebsiteScraper:
-    def __init__(self, base_url):
+    def __init__(self, base_url, max_workers=1, max_per_host=2, min_delay=1.0, cache_dir=None,
+                 checkpoint_path=None, resume=False, output_path=None, keep_pages=True,
+                 parser_backend='lxml', fingerprints_file=DEFAULT_RULES_FILE,
+                 parse_processes=0, parse_queue_size=None, adaptive=True, max_rate=10.0,
+                 max_retries=5, metrics_path=None, max_depth=None, max_pages=None,
+                 visited_set='exact', visited_error_rate=0.001,
+                 max_page_bytes=10 * 1024 * 1024, head_probe='auto', session=None,
+                 throttle=None, archive_path=None, frontier=None, wordpress_api=True):
         self.base_url = base_url
         self.domain = urlparse(base_url).netloc
-        self.visited_urls = set()
-        self.to_visit = deque([base_url])
+        # Deduplicates at enqueue time and pops the most important page first;
+        # distributed_crawl.py passes in one shared by several processes
+        if frontier is None:
+            frontier = CrawlFrontier(max_depth=max_depth, max_pages=max_pages,
+                                     seen=make_visited_set(visited_set, visited_error_rate))
+        self.frontier = frontier
         self.scraped_data = {}
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        self.keep_pages = keep_pages
+        self.parser_backend = parser_backend
+        # Compile every technology signature once for the whole crawl
+        self.fingerprints_file = fingerprints_file
+        self.fingerprinter = Fingerprinter.from_file(fingerprints_file)
+        # With parse_processes > 0, fetching and parsing run as a pipeline:
+        # threads download, a process pool parses, and at most
+        # parse_queue_size downloaded pages wait between the two
+        self.max_workers = max(1, max_workers)
+        self.parse_processes = parse_processes
+        self.parse_queue_size = parse_queue_size or self.max_workers + 2 * parse_processes
+        self.fetched = 0
+        self.pages_found = 0
+        self.robots = None
+        self.sitemap_urls = set()
+        if throttle is not None:
+            self.throttle = throttle
+        elif adaptive:
+            self.throttle = AdaptiveThrottle(max_per_host=max_per_host, min_delay=min_delay,
+                                             max_rate=max_rate)
+        else:
+            self.throttle = HostThrottle(max_per_host=max_per_host, min_delay=min_delay)
+        self.max_retries = max_retries
+        self.retries = {}
+        # Once a page reports WordPress, read the posts and pages from its REST API
+        self.wordpress_api = wordpress_api
+        self.wordpress_home = None  # home page waiting for the REST API pass
+        self.max_page_bytes = max_page_bytes
+        self.head_probe = head_probe
+        # Per-request records stream to crawl_metrics.jsonl beside the summary
+        self.metrics = CrawlMetrics(str(Path(metrics_path).with_suffix('.jsonl'))
+                                    if metrics_path else None)
+        self.metrics_path = metrics_path
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.checkpoint = CrawlCheckpoint(checkpoint_path) if checkpoint_path else None
+        self.resuming = False
+        if self.checkpoint and resume:
+            frontier, visited, self.scraped_data = self.checkpoint.load(
+                base_url, with_pages=keep_pages)
+            self.frontier.restore(frontier, visited)
+            self.pages_found = self.checkpoint.page_count()
+            self.resuming = True
+            print(f"Resuming crawl: {len(visited)} URLs done, "
+                  f"{len(self.frontier)} queued")
+        else:
+            if self.checkpoint:
+                self.checkpoint.start(base_url)
+            # The start page always goes first
+            self.enqueue(base_url, 0, sitemap_priority=1.0)
+        # Stream pages to disk as they finish. A resumed crawl starts the file
+        # again from the checkpoint rather than appending to what may be a
+        # torn line or an unterminated .gz / .zst stream
+        self.output = PageStreamWriter(output_path) if output_path else None
+        if self.output and self.resuming:
+            for slug, page_data in self.checkpoint.iter_pages():
+                self.output.write(slug, page_data)
+        # Every response, raw, for re-extraction without a re-crawl (always appended to)
+        self.archive = WarcWriter(archive_path, base_url) if archive_path else None
+        # A batch crawl passes in one session (and throttle) shared by every site
+        # Keep one pooled connection per worker so threads don't thrash the pool
+        self.session = session or make_session(pool_maxsize=self.max_workers)
         
     def is_valid_url(self, url):
         """Check if URL belongs to the same domain and is valid"""
         parsed = urlparse(url)
         return (parsed.netloc == self.domain and 
                 parsed.scheme in ['http', 'https'] and
-                not url.endswith(('.pdf', '.zip', '.exe', '.dmg')))
+                not url.endswith(('.pdf', '.zip', '.exe', '.dmg')) and
+                self.is_allowed(url))
+    
+    def is_allowed(self, url):
+        """Check robots.txt rules fetched at crawl start (no network)"""
+        if self.robots is None:
+            return True
+        return self.robots.can_fetch(self.session.headers['User-Agent'], url)
     
     def normalize_url(self, url):
         """Normalize URL to avoid duplicates"""
@@ -46,185 +548,369 @@ class WebsiteScraper:
                 absolute_url = urljoin(current_url, href)
                 normalized_url = self.normalize_url(absolute_url)
                 
-                if self.is_valid_url(normalized_url) and normalized_url not in self.visited_urls:
+                if normalized_url not in self.frontier and self.is_valid_url(normalized_url):
                     urls.add(normalized_url)
         
-        # Check for sitemap
+        return urls
+    
+    def enqueue(self, url, depth=0, sitemap_priority=None, lastmod=None):
+        """Add a URL to the frontier (safe to call from worker threads)"""
+        # The start URL arrives as typed ('https://site/'); links to it come normalized
+        url = self.normalize_url(url)
+        priority = self.frontier.push(url, depth, sitemap_priority, lastmod)
+        if priority is not None and self.checkpoint:
+            self.checkpoint.add_to_frontier(url, depth, priority)
+    
+    def prepare_crawl(self):
+        """Fetch robots.txt and sitemaps once and seed the frontier"""
         robots_url = urljoin(self.base_url, '/robots.txt')
+        sitemaps = []
         try:
-            robots_resp = self.session.get(robots_url, timeout=10)
+            with self.throttle.limit(robots_url):
+                robots_resp = self.session.get(robots_url, timeout=10)
             if robots_resp.status_code == 200:
-                for line in robots_resp.text.splitlines():
+                lines = robots_resp.text.splitlines()
+                self.robots = RobotFileParser(robots_url)
+                self.robots.parse(lines)
+                for line in lines:
                     if line.lower().startswith('sitemap:'):
-                        sitemap_url = line.split(':', 1)[1].strip()
-                        self.parse_sitemap(sitemap_url)
-        except:
-            pass
+                        sitemaps.append(line.split(':', 1)[1].strip())
+                
+                crawl_delay = self.robots.crawl_delay(self.session.headers['User-Agent'])
+                if crawl_delay and float(crawl_delay) > self.throttle.min_delay:
+                    print(f"Honouring robots.txt Crawl-delay of {crawl_delay}s for {self.domain}")
+                    self.throttle.set_min_delay(float(crawl_delay), host=self.domain)
+        except Exception as e:
+            print(f"Could not read {robots_url}: {str(e)}")
         
-        return urls
+        # A resumed frontier was already seeded from the sitemaps
+        if self.resuming:
+            return
+        
+        if not sitemaps:
+            sitemaps.append(urljoin(self.base_url, '/sitemap.xml'))
+        
+        for sitemap_url in sitemaps:
+            self.parse_sitemap(sitemap_url)
+        
+        print(f"Read {len(self.sitemap_urls)} sitemap(s), "
+              f"{len(self.frontier)} URLs queued")
     
     def parse_sitemap(self, sitemap_url):
-        """Parse sitemap for additional URLs"""
+        """Parse sitemap (or sitemap index) for additional URLs"""
+        if sitemap_url in self.sitemap_urls:
+            return
+        self.sitemap_urls.add(sitemap_url)
+        
         try:
-            resp = self.session.get(sitemap_url, timeout=10)
+            with self.throttle.limit(sitemap_url):
+                resp = self.session.get(sitemap_url, timeout=10)
             if resp.status_code == 200:
                 soup = BeautifulSoup(resp.content, 'xml')
-                for loc in soup.find_all('loc'):
-                    url = self.normalize_url(loc.text)
-                    if self.is_valid_url(url) and url not in self.visited_urls:
-                        self.to_visit.append(url)
-        except:
+                # A sitemap index points at further sitemaps, not pages
+                if soup.find('sitemapindex'):
+                    for loc in soup.select('sitemap > loc'):
+                        self.parse_sitemap(loc.text.strip())
+                    return
+                
+                # Sitemap pages count as one hop from the start page
+                for entry in soup.find_all('url'):
+                    loc = entry.find('loc')
+                    if loc is None:
+                        continue
+                    url = self.normalize_url(loc.text.strip())
+                    if not self.is_valid_url(url):
+                        continue
+                    priority = entry.find('priority')
+                    try:
+                        sitemap_priority = float(priority.text) if priority is not None else None
+                    except ValueError:
+                        sitemap_priority = None
+                    lastmod = entry.find('lastmod')
+                    self.enqueue(url, 1, sitemap_priority,
+                                 parse_lastmod(lastmod.text) if lastmod is not None else None)
+        except Exception:
             pass
     
-    def detect_cms(self, soup, response):
-        """Detect CMS and other technologies"""
-        cms_data = {
-            'cms': None,
-            'technologies': [],
-            'meta_generator': None
-        }
+    def detect_cms(self, soup, response, html=None):
+        """Detect CMS and other technologies (pass html to reuse an already decoded body)"""
+        if html is None:
+            html, _, _ = decode_html(response.content, response.headers)
+        return self.fingerprinter.detect(soup, response.headers, html)
+    
+    SECTION_SKIP_CLASSES = ('nav', 'footer', 'header')
+    TEXT_TAGS = ('p', 'li', 'span')
+    HEADING_TAGS = ('h1', 'h2', 'h3', 'h4')
+    VIDEO_TAGS = ('video', 'iframe')
+    
+    def is_section_element(self, element):
+        """Match the section patterns: section, div.section, .content-section,
+        article, main > div and .container > div"""
+        classes = element.get('class') or []
+        if any(cls in ' '.join(classes).lower() for cls in self.SECTION_SKIP_CLASSES):
+            return False
         
-        # Check meta generator
-        generator = soup.find('meta', {'name': 'generator'})
-        if generator:
-            cms_data['meta_generator'] = generator.get('content', '')
-            
-        # Check for WordPress
-        if soup.find('link', {'href': re.compile(r'wp-content|wp-includes')}) or \
-           soup.find('script', {'src': re.compile(r'wp-content|wp-includes')}):
-            cms_data['cms'] = 'WordPress'
-            
-        # Check for other common CMS patterns
-        if 'wix' in response.text.lower():
-            cms_data['cms'] = 'Wix'
-        elif 'squarespace' in response.text.lower():
-            cms_data['cms'] = 'Squarespace'
-        elif soup.find('meta', {'name': 'application-name', 'content': 'Webflow'}):
-            cms_data['cms'] = 'Webflow'
-            
-        return cms_data
+        name = element.name
+        if name in ('section', 'article') or 'content-section' in classes:
+            return True
+        if name != 'div':
+            return False
+        if 'section' in classes:
+            return True
+        parent = element.parent
+        return parent is not None and (parent.name == 'main' or
+                                       'container' in (parent.get('class') or []))
     
     def extract_sections(self, soup):
-        """Extract content organized by sections"""
-        sections = []
-        section_index = 1
+        """Extract content organized by sections.
         
-        # Common section patterns
-        section_selectors = [
-            'section', 'div.section', '.content-section', 
-            'article', 'main > div', '.container > div'
-        ]
+        One walk over the tree: every element belongs to its innermost
+        enclosing section, so nested sections and nested text tags (a span
+        inside a p) are only emitted once."""
+        sections = []
         
-        for selector in section_selectors:
-            for element in soup.select(selector):
-                # Skip if it's navigation or footer
-                if any(cls in str(element.get('class', [])).lower() for cls in ['nav', 'footer', 'header']):
-                    continue
-                
-                section_data = {
-                    'index': section_index,
+        # (element, section it belongs to, already inside a text tag)
+        stack = [(soup, None, False)]
+        while stack:
+            element, section, in_text = stack.pop()
+            
+            if element is not soup and self.is_section_element(element):
+                section = {
+                    'index': None,
                     'title': None,
                     'content': [],
                     'images': [],
                     'videos': []
                 }
-                
-                # Find section title
-                heading = element.find(['h1', 'h2', 'h3', 'h4'])
-                if heading:
-                    section_data['title'] = heading.get_text(strip=True)
-                
-                # Extract text content
-                for p in element.find_all(['p', 'li', 'span']):
-                    text = p.get_text(strip=True)
+                sections.append(section)
+            
+            if section is not None:
+                name = element.name
+                if name in self.HEADING_TAGS:
+                    if section['title'] is None:
+                        section['title'] = element.get_text(strip=True)
+                elif name in self.TEXT_TAGS and not in_text:
+                    text = element.get_text(strip=True)
                     if text and len(text) > 20:  # Skip very short text
-                        section_data['content'].append(text)
-                
-                # Extract images
-                for img in element.find_all('img'):
+                        section['content'].append(text)
+                    in_text = True
+                elif name == 'img':
                     img_data = {
-                        'src': img.get('src', ''),
-                        'alt': img.get('alt', ''),
-                        'title': img.get('title', '')
+                        'src': element.get('src', ''),
+                        'alt': element.get('alt', ''),
+                        'title': element.get('title', '')
                     }
                     if img_data['src']:
-                        section_data['images'].append(img_data)
-                
-                # Extract videos
-                for video in element.find_all(['video', 'iframe']):
-                    if video.name == 'video':
-                        video_data = {'src': video.get('src', ''), 'type': 'video'}
-                    else:  # iframe
-                        video_data = {'src': video.get('src', ''), 'type': 'iframe'}
+                        section['images'].append(img_data)
+                elif name in self.VIDEO_TAGS:
+                    video_data = {'src': element.get('src', ''),
+                                  'type': 'video' if name == 'video' else 'iframe'}
                     if video_data['src']:
-                        section_data['videos'].append(video_data)
-                
-                if section_data['content'] or section_data['images'] or section_data['videos']:
-                    sections.append(section_data)
-                    section_index += 1
+                        section['videos'].append(video_data)
+            
+            # Push children reversed so they pop in document order
+            children = [child for child in element.children if child.name]
+            for child in reversed(children):
+                stack.append((child, section, in_text))
         
+        sections = [section for section in sections
+                    if section['content'] or section['images'] or section['videos']]
+        for section_index, section in enumerate(sections, 1):
+            section['index'] = section_index
         return sections
     
+    def check_headers(self, url, headers, status_code):
+        """Raise SkippedDownload if the headers alone rule a response out"""
+        content_type = headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in HTML_CONTENT_TYPES + UNTYPED_CONTENT_TYPES:
+            raise SkippedDownload(url, 'not html', f"not HTML ({content_type})", status_code)
+        length = headers.get('Content-Length', '')
+        if length.isdigit() and int(length) > self.max_page_bytes:
+            raise SkippedDownload(url, 'too large', f"too large ({int(length) / 1024 / 1024:.1f} MB)",
+                                  status_code)
+    
+    def should_probe(self, url):
+        """HEAD first? Only for URLs that don't look like pages, unless told otherwise"""
+        if self.head_probe == 'off':
+            return False
+        if self.head_probe == 'always':
+            return True
+        return os.path.splitext(urlparse(url).path)[1].lower() not in PAGE_EXTENSIONS
+    
+    def probe(self, url):
+        """HEAD a URL and raise SkippedDownload if it is not a page worth a GET"""
+        try:
+            head = self.session.head(url, timeout=10, allow_redirects=True)
+        except requests.RequestException:
+            return
+        self.metrics.record_probe()
+        # Servers that don't support HEAD (405, 501, ...) are left to the GET
+        if 200 <= head.status_code < 300:
+            self.check_headers(url, head.headers, head.status_code)
+    
+    def read_body(self, url, response):
+        """Stream the body in, giving up on non-HTML or oversized responses"""
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        success = 200 <= response.status_code < 300
+        try:
+            if success:
+                self.check_headers(url, response.headers, response.status_code)
+            
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(READ_CHUNK):
+                size += len(chunk)
+                if success and not chunks and content_type in UNTYPED_CONTENT_TYPES \
+                        and not sniff_html(chunk):
+                    raise SkippedDownload(url, 'not html', "untyped body that is not HTML",
+                                          response.status_code, size)
+                if size > self.max_page_bytes:
+                    raise SkippedDownload(url, 'too large',
+                                          f"over {self.max_page_bytes / 1024 / 1024:.1f} MB",
+                                          response.status_code, size)
+                chunks.append(chunk)
+        except SkippedDownload:
+            # Closing drops the connection instead of draining the rest
+            response.close()
+            raise
+        response._content = b''.join(chunks)
+    
+    def fetch(self, url):
+        """GET a page, revalidating against the response cache when enabled"""
+        headers = self.cache.conditional_headers(url) if self.cache else {}
+        timings = {}
+        queued = time.perf_counter()
+        try:
+            with self.throttle.limit(url):
+                started = time.perf_counter()
+                timings['wait'] = started - queued
+                # A HEAD probe counts towards time to first byte
+                if self.should_probe(url):
+                    self.probe(url)
+                response = self.session.get(url, timeout=15, headers=headers, stream=True)
+                headers_at = time.perf_counter()
+                timings['ttfb'] = headers_at - started
+                # Read the body while still holding this host's request slot
+                try:
+                    self.read_body(url, response)
+                finally:
+                    timings['download'] = time.perf_counter() - headers_at
+        except SkippedDownload as skipped:
+            self.metrics.record_fetch(url, skipped.status_code, skipped.wasted, timings)
+            self.metrics.record_abort(url, skipped.reason)
+            raise
+        except Exception:
+            self.metrics.record_fetch(url, 'error', 0, timings)
+            raise
+        
+        from_cache = self.cache is not None and response.status_code == 304
+        self.metrics.record_fetch(url, response.status_code, len(response.content), timings,
+                                  from_cache=from_cache)
+        self.throttle.feedback(url, response.status_code, timings['ttfb'],
+                               parse_retry_after(response.headers.get('Retry-After')))
+        if response.status_code in THROTTLE_STATUSES:
+            raise Throttled(url, response.status_code)
+        
+        if self.cache:
+            if response.status_code == 304:
+                response = self.cache.revalidated(url, response)
+            elif response.ok:
+                self.cache.store(url, response)
+        if self.archive:
+            # A revalidated page is archived as the 200 it stands for
+            version = {10: 'HTTP/1.0'}.get(getattr(response.raw, 'version', 11), 'HTTP/1.1')
+            self.archive.write_response(url, response.status_code, response.reason,
+                                        response.headers, response.content, version)
+        return response
+    
     def scrape_page(self, url):
         """Scrape a single page"""
         try:
             print(f"Scraping: {url}")
-            response = self.session.get(url, timeout=15)
+            response = self.fetch(url)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract basic page data
-            page_data = {
-                'url': url,
-                'title': soup.find('title').get_text(strip=True) if soup.find('title') else '',
-                'meta_description': '',
-                'cms_info': self.detect_cms(soup, response),
-                'sections': self.extract_sections(soup),
-                'all_images': [],
-                'navigation_links': [],
-                'scraped_at': datetime.now().isoformat()
-            }
-            
-            # Meta description
-            meta_desc = soup.find('meta', {'name': 'description'})
-            if meta_desc:
-                page_data['meta_description'] = meta_desc.get('content', '')
-            
-            # All images on page
-            for img in soup.find_all('img'):
-                img_url = img.get('src', '')
-                if img_url:
-                    page_data['all_images'].append({
-                        'src': urljoin(url, img_url),
-                        'alt': img.get('alt', ''),
-                        'title': img.get('title', '')
-                    })
-            
-            # Navigation links
-            nav_elements = soup.find_all(['nav', 'header'])
-            for nav in nav_elements:
-                for link in nav.find_all('a'):
-                    href = link.get('href', '')
-                    text = link.get_text(strip=True)
-                    if href and text:
-                        page_data['navigation_links'].append({
-                            'text': text,
-                            'href': href
-                        })
+            timings = {}
+            page_data, new_urls = self.parse_page(url, response, timings)
+            self.metrics.record_timings(url, timings)
             
             # Discover new URLs
-            new_urls = self.discover_urls(soup, url)
+            depth = self.frontier.depth_of(url) + 1
             for new_url in new_urls:
-                if new_url not in self.visited_urls:
-                    self.to_visit.append(new_url)
+                self.enqueue(new_url, depth)
             
             return page_data
             
+        except Throttled:
+            raise
+        except SkippedDownload as skipped:
+            print(f"Skipping {url}: {skipped.detail}")
+            return None
         except Exception as e:
             print(f"Error scraping {url}: {str(e)}")
             return None
     
+    def parse_page(self, url, response, timings=None):
+        """Build the page record from a fetched response; returns (page_data, new_urls).
+        
+        Pass a dict as timings to get parse/extract/fingerprint durations."""
+        started = time.perf_counter()
+        # Decode once, from the bytes; parsing and fingerprinting share the text
+        html, _, _ = decode_html(response.content, response.headers)
+        soup = parse_html(html, self.parser_backend)
+        parsed_at = time.perf_counter()
+        cms_info = self.detect_cms(soup, response, html)
+        detected_at = time.perf_counter()
+        sections = self.extract_sections(soup)
+        extracted_at = time.perf_counter()
+        
+        # Extract basic page data
+        title = soup.find('title')
+        page_data = {
+            'url': url,
+            'title': title.get_text(strip=True) if title else '',
+            'meta_description': '',
+            'cms_info': cms_info,
+            'sections': sections,
+            'all_images': [],
+            'navigation_links': [],
+            'scraped_at': datetime.now().isoformat()
+        }
+        
+        # Meta description
+        meta_desc = soup.find('meta', {'name': 'description'})
+        if meta_desc:
+            page_data['meta_description'] = meta_desc.get('content', '')
+        
+        # All images on page
+        for img in soup.find_all('img'):
+            img_url = img.get('src', '')
+            if img_url:
+                page_data['all_images'].append({
+                    'src': urljoin(url, img_url),
+                    'alt': img.get('alt', ''),
+                    'title': img.get('title', '')
+                })
+        
+        # Navigation links
+        nav_elements = soup.find_all(['nav', 'header'])
+        for nav in nav_elements:
+            for link in nav.find_all('a'):
+                href = link.get('href', '')
+                text = link.get_text(strip=True)
+                if href and text:
+                    page_data['navigation_links'].append({
+                        'text': text,
+                        'href': href
+                    })
+        
+        new_urls = self.discover_urls(soup, url)
+        if timings is not None:
+            timings['parse'] = parsed_at - started
+            timings['fingerprint'] = detected_at - parsed_at
+            timings['extract'] = extracted_at - detected_at
+        return page_data, new_urls
+    
     def create_slug(self, url):
         """Create a slug from URL for file naming"""
         path = urlparse(url).path
@@ -235,36 +921,341 @@ class WebsiteScraper:
         slug = re.sub(r'[^a-zA-Z0-9-]', '', slug)
         return slug or 'index'
     
+    def store_page(self, url, page_data):
+        """Record a finished URL in memory, the output stream and the checkpoint"""
+        slug = None
+        if page_data:
+            slug = self.create_slug(url)
+            self.pages_found += 1
+            if self.keep_pages:
+                self.scraped_data[slug] = page_data
+            if self.output:
+                self.output.write(slug, page_data)
+        if self.checkpoint:
+            self.checkpoint.finish(url, slug, page_data)
+        self.frontier.done(url)
+        self.metrics.finish(url)
+        self.check_wordpress(page_data)
+    
+    def check_wordpress(self, page_data):
+        """Line up the REST API pass the first time a page reports WordPress"""
+        if self.wordpress_api and page_data and page_data['cms_info'].get('cms') == 'WordPress':
+            # The crawl loop hands the pass to a worker (start_wordpress_api)
+            self.wordpress_api = False  # one attempt per crawl
+            self.wordpress_home = page_data
+    
+    def start_wordpress_api(self, pool):
+        """Submit the REST API pass to pool if WordPress was just detected; returns its future"""
+        home_page, self.wordpress_home = self.wordpress_home, None
+        if home_page is None:
+            return None
+        return pool.submit(self.fetch_wordpress_pages, home_page)
+    
+    def fetch_wordpress_pages(self, home_page):
+        """Read every page and post from the REST API, in a worker thread;
+        returns ([(url, page_data, new_urls)], requests made)"""
+        api = WordPressAPI(self.base_url, self.session, self.throttle, self.metrics)
+        pages = []
+        try:
+            for page in api.iter_site_pages(self, home_page):
+                pages.append(page)
+        except Exception as e:
+            # A malformed body or header from the API must not end the crawl:
+            # keep what was read and leave the rest to the HTML crawl
+            print(f"WordPress REST API failed after {len(pages)} pages: {str(e)}")
+        return pages, api.requests
+    
+    def store_wordpress_pages(self, pages, requests_made):
+        """Store the REST API's pages instead of crawling them as HTML"""
+        stored = 0
+        already = 0
+        for url, page_data, new_urls in pages:
+            # Pages crawled (or being crawled) as HTML keep their HTML version
+            if not self.frontier.discard(url):
+                already += 1
+                continue
+            for new_url in new_urls:
+                self.enqueue(new_url, 1)
+            self.store_page(url, page_data)
+            stored += 1
+        if stored or already:
+            print(f"WordPress REST API: {stored} pages and posts in {requests_made} requests "
+                  f"({already} already crawled); crawling the rest as HTML")
+        else:
+            print(f"WordPress REST API not available ({requests_made} requests); crawling as HTML")
+    
+    def next_url(self):
+        """Pop the next URL that still needs fetching, or None"""
+        while True:
+            url = self.frontier.pop()
+            if url is None or self.is_allowed(url):
+                return url
+            self.frontier.skip(url)
+    
+    def requeue(self, url):
+        """Put a throttled URL back on the frontier, up to max_retries times"""
+        self.metrics.finish(url)  # the retry is a request of its own
+        attempts = self.retries.get(url, 0) + 1
+        self.retries[url] = attempts
+        if attempts > self.max_retries:
+            print(f"Giving up on {url} after {self.max_retries} throttled attempts")
+            self.fetched += 1
+            self.store_page(url, None)
+            return
+        # Still in the checkpoint frontier, so only the in-memory queue needs it
+        self.frontier.requeue(url)
+    
+    def crawl_threaded(self):
+        """Fetch and parse each page in the same worker thread"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            in_flight = {}
+            while self.frontier or in_flight or self.wordpress_home:
+                wordpress_job = self.start_wordpress_api(pool)
+                if wordpress_job:
+                    in_flight[wordpress_job] = WORDPRESS_API
+                while len(in_flight) < self.max_workers:
+                    current_url = self.next_url()
+                    if current_url is None:
+                        break
+                    in_flight[pool.submit(self.scrape_page, current_url)] = current_url
+                
+                if not in_flight:
+                    continue
+                
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    current_url = in_flight.pop(future)
+                    if current_url == WORDPRESS_API:
+                        self.store_wordpress_pages(*future.result())
+                        continue
+                    try:
+                        page_data = future.result()
+                    except Throttled:
+                        self.requeue(current_url)
+                        continue
+                    self.fetched += 1
+                    self.store_page(current_url, page_data)
+    
+    def fetch_raw(self, url):
+        """Download a page for the parse pool; returns (content, headers, encoding) or None"""
+        try:
+            print(f"Scraping: {url}")
+            response = self.fetch(url)
+            response.raise_for_status()
+            return response.content, dict(response.headers), response.encoding
+        except Throttled:
+            raise
+        except SkippedDownload as skipped:
+            print(f"Skipping {url}: {skipped.detail}")
+            return None
+        except Exception as e:
+            print(f"Error scraping {url}: {str(e)}")
+            return None
+    
+    def crawl_pipelined(self):
+        """Fetch in threads and parse in a process pool, with a bounded queue between"""
+        downloaded = deque()  # (url, raw response) waiting for a free parser
+        fetching = {}
+        parsing = {}
+        parse_slots = self.parse_processes * 2  # keep every process busy
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as io_pool, \
+             ProcessPoolExecutor(max_workers=self.parse_processes,
+                                 initializer=init_parse_worker,
+                                 initargs=(self.base_url, self.parser_backend,
+                                           str(self.fingerprints_file))) as parse_pool:
+            while self.frontier or fetching or downloaded or parsing or self.wordpress_home:
+                wordpress_job = self.start_wordpress_api(io_pool)
+                if wordpress_job:
+                    fetching[wordpress_job] = WORDPRESS_API
+                # Backpressure: stop downloading while the queue is full
+                while (len(fetching) < self.max_workers and
+                       len(fetching) + len(downloaded) < self.parse_queue_size):
+                    url = self.next_url()
+                    if url is None:
+                        break
+                    fetching[io_pool.submit(self.fetch_raw, url)] = url
+                
+                while downloaded and len(parsing) < parse_slots:
+                    url, raw = downloaded.popleft()
+                    parsing[parse_pool.submit(parse_raw_page, url, *raw)] = url
+                
+                if not (fetching or parsing):
+                    continue
+                
+                done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fetching:
+                        url = fetching.pop(future)
+                        if url == WORDPRESS_API:
+                            self.store_wordpress_pages(*future.result())
+                            continue
+                        try:
+                            raw = future.result()
+                        except Throttled:
+                            self.requeue(url)
+                            continue
+                        if raw is not None:
+                            downloaded.append((url, raw))
+                            continue
+                        page_data, new_urls = None, []
+                    else:
+                        url = parsing.pop(future)
+                        try:
+                            page_data, new_urls, timings = future.result()
+                            self.metrics.record_timings(url, timings)
+                        except Exception as e:
+                            print(f"Error parsing {url}: {str(e)}")
+                            page_data, new_urls = None, []
+                    
+                    # Links found by the parsers flow back into the frontier
+                    depth = self.frontier.depth_of(url) + 1
+                    for new_url in new_urls:
+                        self.enqueue(new_url, depth)
+                    self.fetched += 1
+                    self.store_page(url, page_data)
+    
     def scrape_all(self):
         """Main scraping method"""
-        print(f"Starting scrape of {self.base_url}")
+        mode = (f"{self.parse_processes} parse processes" if self.parse_processes
+                else "parsing in fetch threads")
+        print(f"Starting scrape of {self.base_url} "
+              f"({self.max_workers} workers, {self.throttle.max_per_host} per host, "
+              f"{self.throttle.min_delay}s delay, {mode})")
+        started = time.monotonic()
+        self.fetched = 0
+        self.prepare_crawl()
         
-        while self.to_visit:
-            current_url = self.to_visit.popleft()
-            
-            if current_url in self.visited_urls:
-                continue
-            
-            self.visited_urls.add(current_url)
-            page_data = self.scrape_page(current_url)
-            
-            if page_data:
-                slug = self.create_slug(current_url)
-                self.scraped_data[slug] = page_data
-            
-            # Be respectful with rate limiting
-            time.sleep(1)
+        # Only this thread pops the frontier and touches scraped_data;
+        # workers just fetch, parse and queue the links they find.
+        try:
+            if self.parse_processes:
+                self.crawl_pipelined()
+            else:
+                self.crawl_threaded()
+        except KeyboardInterrupt:
+            # Pages still in flight stay in the saved frontier and are
+            # fetched again on --resume
+            print("\nInterrupted.", "Run again with --resume to continue."
+                  if self.checkpoint else "")
         
-        print(f"Scraping complete. Found {len(self.scraped_data)} pages.")
+        elapsed = time.monotonic() - started
+        rate = self.fetched / elapsed if elapsed else 0.0
+        if self.output:
+            self.output.close()
+            print(f"Wrote {self.output.count} pages to {self.output.path}")
+        if self.archive:
+            self.archive.close()
+            print(f"Archived {self.archive.count} responses to {self.archive.path}")
+        print(f"Scraping complete. Found {self.pages_found} pages.")
+        print(f"Fetched {self.fetched} URLs in {elapsed:.1f}s ({rate:.2f} pages/sec)")
+        if self.retries:
+            print(f"Throttled {sum(self.retries.values())} times across {len(self.retries)} URLs")
+        print(self.frontier.summary())
+        print(describe_memory(self.frontier.seen))
+        print(self.throttle.summary())
+        if self.cache:
+            print(self.cache.summary())
+        print(self.metrics.report())
+        if self.metrics_path:
+            self.metrics.write_json(self.metrics_path)
+            print(f"Crawl metrics saved to {self.metrics_path} "
+                  f"(every request in {self.metrics.records_path})")
+        self.metrics.close()
         return self.scraped_data
 
+# Each parse-pool process keeps its own scraper for parse_page
+_parse_worker = None
+
+def init_parse_worker(base_url, parser_backend, fingerprints_file):
+    global _parse_worker
+    _parse_worker = WebsiteScraper(base_url, parser_backend=parser_backend,
+                                   fingerprints_file=fingerprints_file)
+
+def parse_raw_page(url, content, headers, encoding):
+    """Parse a downloaded page in a worker process; returns (page_data, new_urls, timings)"""
+    response = build_response(url, content, headers, encoding)
+    timings = {}
+    page_data, new_urls = _parse_worker.parse_page(url, response, timings)
+    return page_data, sorted(new_urls), timings
+
 # Create scraper instance and run
 if __name__ == "__main__":
-    scraper = WebsiteScraper("https://whitemassif.com/")
+    parser = argparse.ArgumentParser(description="Scrape a website into scraped-content/")
+    parser.add_argument('url', nargs='?', default="https://whitemassif.com/")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of pages fetched in parallel")
+    parser.add_argument('--per-host', type=int, default=2,
+                        help="maximum concurrent requests to one host")
+    parser.add_argument('--delay', type=float, default=1.0,
+                        help="minimum seconds between requests to one host")
+    parser.add_argument('--max-rate', type=float, default=10.0,
+                        help="ceiling for the adaptive per-host request rate (requests/sec)")
+    parser.add_argument('--fixed-rate', action='store_true',
+                        help="space requests by --delay only, without adapting to the server")
+    parser.add_argument('--cache-dir', default='scraped-content/cache',
+                        help="where to keep pages for conditional re-crawls")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always download pages in full")
+    parser.add_argument('--checkpoint', default='scraped-content/metadata/crawl.sqlite3',
+                        help="SQLite file the crawl state is saved to as it runs")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue the crawl saved in --checkpoint")
+    parser.add_argument('--output', default='scraped-content/metadata/all_pages.jsonl',
+                        help="where pages go: .jsonl (or .jsonl.gz / .jsonl.zst) is written "
+                             "page by page as the crawl runs, .json is written once at the end")
+    parser.add_argument('--archive', default=None,
+                        help="also append every raw response to this WARC file "
+                             "(e.g. scraped-content/metadata/responses.warc.gz) for reextract.py")
+    parser.add_argument('--metrics-json', default='scraped-content/metadata/crawl_metrics.json',
+                        help="where to save per-request timings and the summary as JSON")
+    parser.add_argument('--parse-processes', type=int, default=0,
+                        help="parse pages in this many processes while threads keep downloading")
+    parser.add_argument('--parse-queue', type=int, default=None,
+                        help="maximum downloaded pages waiting for a parse process")
+    parser.add_argument('--parser', choices=PARSER_BACKENDS, default='lxml',
+                        help="HTML parser backend (lexbor needs selectolax installed)")
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help="ignore links more than this many hops from the start page")
+    parser.add_argument('--max-pages', type=int, default=None,
+                        help="stop after fetching this many URLs (most important first)")
+    parser.add_argument('--max-page-mb', type=float, default=10.0,
+                        help="abandon pages bigger than this many megabytes")
+    parser.add_argument('--head-probe', choices=HEAD_PROBE_MODES, default='auto',
+                        help="send a HEAD before the GET: auto does it for URLs whose "
+                             "extension doesn't look like a page")
+    parser.add_argument('--no-wp-api', action='store_true',
+                        help="crawl WordPress sites page by page instead of reading "
+                             "posts and pages from the REST API")
+    parser.add_argument('--visited-set', choices=VISITED_SET_KINDS, default='exact',
+                        help="how seen URLs are remembered: exact strings, 64-bit hashes, "
+                             "or a Bloom filter (least memory, may skip a few pages)")
+    parser.add_argument('--bloom-error-rate', type=float, default=0.001,
+                        help="false-positive rate for --visited-set bloom")
+    args = parser.parse_args()
+    stream_output = not args.output.endswith('.json')
+    
+    scraper = WebsiteScraper(args.url, max_workers=args.workers,
+                             max_per_host=args.per_host, min_delay=args.delay,
+                             cache_dir=None if args.no_cache else args.cache_dir,
+                             checkpoint_path=args.checkpoint, resume=args.resume,
+                             output_path=args.output if stream_output else None,
+                             keep_pages=not stream_output, parser_backend=args.parser,
+                             parse_processes=args.parse_processes,
+                             parse_queue_size=args.parse_queue,
+                             adaptive=not args.fixed_rate, max_rate=args.max_rate,
+                             metrics_path=args.metrics_json,
+                             max_depth=args.max_depth, max_pages=args.max_pages,
+                             visited_set=args.visited_set,
+                             visited_error_rate=args.bloom_error_rate,
+                             max_page_bytes=int(args.max_page_mb * 1024 * 1024),
+                             head_probe=args.head_probe, archive_path=args.archive,
+                             wordpress_api=not args.no_wp_api)
     scraped_data = scraper.scrape_all()
     
     # Save raw scraped data
-    with open('scraped-content/metadata/all_pages.json', 'w', encoding='utf-8') as f:
-        json.dump(scraped_data, f, indent=2, ensure_ascii=False)
+    if not stream_output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(scraped_data, f, indent=2, ensure_ascii=False)
     
-    print(f"Scraped data saved to scraped-content/metadata/all_pages.json")
\ No newline at end of file
+    print(f"Scraped data saved to {args.output}")
\ No newline at end of file
@@ -0,0 +1,341 @@
+import json
+import sqlite3
+import threading
+import time
+
+from frontier import DEFAULT_PATH_PRIORITIES, CrawlFrontier
+
+# Crawl frontier shared by several scraper processes, possibly on several
+# machines, through one SQLite file. Workers lease a few URLs at a time;
+# a lease has to be renewed every lease_seconds or it runs out and the URL
+# goes back in the queue for another worker, so a crashed or killed worker
+# costs nothing but the wait. Finished pages go to the same file, which is
+# the crawl's shared results store.
+#
+#   queued   waiting for a worker
+#   leased   handed to a worker (worker, lease_until)
+#   done     fetched; its page, if any, is in the pages table
+#   skipped  handed out but not fetched (robots.txt), refunded to the budget
+#   failed   leased max_attempts times without ever finishing
+#
+# Links found by a worker are held in memory and written in the same
+# transaction as the page they were found on. The first worker seeds the
+# queue from the sitemaps; until it marks the crawl seeded (or stops
+# renewing), the others keep polling even when the queue is empty.
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS crawl (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS urls (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                                     url TEXT UNIQUE, depth INTEGER, priority REAL,
+                                     state TEXT NOT NULL DEFAULT 'queued',
+                                     issued INTEGER NOT NULL DEFAULT 0,
+                                     attempts INTEGER NOT NULL DEFAULT 0,
+                                     worker TEXT, lease_until REAL);
+    CREATE INDEX IF NOT EXISTS urls_by_state ON urls (state, priority DESC, seq);
+    CREATE TABLE IF NOT EXISTS pages (slug TEXT PRIMARY KEY, url TEXT, worker TEXT, data TEXT);
+    CREATE TABLE IF NOT EXISTS workers (worker TEXT PRIMARY KEY, started REAL, last_seen REAL,
+                                        fetched INTEGER NOT NULL DEFAULT 0);
+"""
+
+URL_STATES = ('queued', 'leased', 'done', 'skipped', 'failed')
+
+def connect(db_path):
+    """SQLite connection set up for several writers"""
+    conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+def start_crawl(db_path, base_url, max_depth=None, max_pages=None):
+    """Forget any previous crawl in db_path and set up a new one"""
+    conn = connect(db_path)
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        for table in ('crawl', 'urls', 'pages', 'workers'):
+            conn.execute(f'DELETE FROM {table}')
+        conn.executemany('INSERT INTO crawl VALUES (?, ?)',
+                         [('base_url', base_url), ('max_depth', json.dumps(max_depth)),
+                          ('max_pages', json.dumps(max_pages))])
+    conn.close()
+
+def crawl_settings(conn):
+    """(base_url, max_depth, max_pages) recorded by start_crawl"""
+    settings = dict(conn.execute('SELECT key, value FROM crawl'))
+    if 'base_url' not in settings:
+        raise ValueError("no crawl has been started in this database")
+    return (settings['base_url'], json.loads(settings.get('max_depth', 'null')),
+            json.loads(settings.get('max_pages', 'null')))
+
+def crawl_status(conn):
+    """URL counts by state, page count and per-worker progress"""
+    counts = dict.fromkeys(URL_STATES, 0)
+    counts.update(conn.execute('SELECT state, COUNT(*) FROM urls GROUP BY state'))
+    pages = conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+    workers = conn.execute('SELECT worker, started, last_seen, fetched FROM workers '
+                           'ORDER BY started').fetchall()
+    return counts, pages, workers
+
+class SharedFrontier(CrawlFrontier):
+    """CrawlFrontier whose queue lives in a SQLite file shared by every worker"""
+    def __init__(self, db_path, worker_id, lease_seconds=60, batch=4, max_attempts=3,
+                 poll_interval=0.25, path_priorities=DEFAULT_PATH_PRIORITIES, seen=None):
+        self.db_path = db_path
+        self.conn = connect(db_path)
+        self.base_url, max_depth, max_pages = crawl_settings(self.conn)
+        super().__init__(max_depth=max_depth, max_pages=max_pages,
+                         path_priorities=path_priorities, seen=seen)
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._db_lock = threading.Lock()
+        self._leased = []       # (url, depth) leased but not yet handed out
+        self._new = {}          # url -> (depth, priority) not yet written
+        self._heartbeat = None
+        self._stopped = threading.Event()
+        self.finished = 0
+        now = time.time()
+        self._execute('INSERT INTO workers (worker, started, last_seen) VALUES (?, ?, ?) '
+                      'ON CONFLICT(worker) DO UPDATE SET last_seen = excluded.last_seen',
+                      (worker_id, now, now))
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def claim(self, key):
+        """True for the first worker to claim key, e.g. seeding from the sitemaps"""
+        with self._db_lock:
+            cursor = self.conn.execute('INSERT OR IGNORE INTO crawl VALUES (?, ?)',
+                                       (key, self.worker_id))
+            return cursor.rowcount == 1
+
+    def push(self, url, depth=0, sitemap_priority=None, lastmod=None):
+        """Queue url for every worker; returns its priority or None if already seen here"""
+        if self.max_depth is not None and depth > self.max_depth:
+            with self._lock:
+                self.too_deep += 1
+            return None
+        priority = self.score(url, depth, sitemap_priority, lastmod)
+        with self._lock:
+            if url in self.seen:
+                queued = self._new.get(url)
+                if queued is None or queued[1] >= priority:
+                    return None
+            self.seen.add(url)
+            self._new[url] = (depth, priority)
+        return priority
+
+    def _flush(self, conn):
+        # Called inside a transaction; a URL another worker already knows is
+        # only touched if it is still queued and now more important
+        with self._lock:
+            new, self._new = self._new, {}
+        conn.executemany('INSERT INTO urls (url, depth, priority) VALUES (?, ?, ?) '
+                         'ON CONFLICT(url) DO UPDATE SET depth = excluded.depth, '
+                         'priority = excluded.priority '
+                         "WHERE urls.state = 'queued' AND excluded.priority > urls.priority",
+                         [(url, depth, priority) for url, (depth, priority) in new.items()])
+
+    def finish_seeding(self):
+        """Publish the URLs found in the sitemaps and let idle workers stop waiting for them"""
+        with self._db_lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self._flush(self.conn)
+            self.conn.execute('INSERT OR IGNORE INTO crawl VALUES (?, ?)', ('seeded', self.worker_id))
+
+    def _lease(self, count):
+        """Lease up to count URLs, retries first, new ones within the page budget"""
+        now = time.time()
+        with self._db_lock, self.conn:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            self._flush(conn)
+            # Leases nobody renewed: the worker died, so try someone else
+            conn.execute("UPDATE urls SET state = CASE WHEN attempts >= ? THEN 'failed' "
+                         "ELSE 'queued' END, worker = NULL "
+                         "WHERE state = 'leased' AND lease_until < ?", (self.max_attempts, now))
+            rows = conn.execute("SELECT url, depth FROM urls WHERE state = 'queued' AND issued = 1 "
+                                "ORDER BY priority DESC, seq LIMIT ?", (count,)).fetchall()
+            room = count - len(rows)
+            if self.max_pages is not None:
+                issued = conn.execute('SELECT COUNT(*) FROM urls WHERE issued = 1').fetchone()[0]
+                room = min(room, self.max_pages - issued)
+            if room > 0:
+                rows += conn.execute("SELECT url, depth FROM urls WHERE state = 'queued' "
+                                     "AND issued = 0 ORDER BY priority DESC, seq LIMIT ?",
+                                     (room,)).fetchall()
+            conn.executemany("UPDATE urls SET state = 'leased', issued = 1, "
+                             "attempts = attempts + 1, worker = ?, lease_until = ? WHERE url = ?",
+                             [(self.worker_id, now + self.lease_seconds, url) for url, _ in rows])
+        return [(url, depth or 0) for url, depth in rows]
+
+    def pop(self):
+        """Hand out a leased URL, or None (after a short wait if this worker is idle)"""
+        with self._lock:
+            need = not self._leased
+        if need:
+            leased = self._lease(self.batch)
+            with self._lock:
+                self._leased.extend(leased)
+        with self._lock:
+            if self._leased:
+                url, depth = self._leased.pop(0)
+                self.active[url] = (None, depth)
+                self.issued += 1
+                return url
+            idle = not self.active
+        # Nothing to lease yet: other workers may still add links or die
+        # and leave their URLs behind, so poll rather than spin
+        if idle:
+            time.sleep(self.poll_interval)
+        return None
+
+    def requeue(self, url):
+        """Give a throttled URL back without counting the attempt"""
+        with self._lock:
+            if self.active.pop(url, None) is None:
+                return
+        self._execute("UPDATE urls SET state = 'queued', attempts = attempts - 1, worker = NULL "
+                      "WHERE url = ? AND worker = ?", (url, self.worker_id))
+
+    def finish(self, url, slug=None, page_data=None):
+        """Record url as done, with its page and the links found so far, in one transaction"""
+        with self._lock:
+            self.active.pop(url, None)
+        with self._db_lock, self.conn:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            self._flush(conn)
+            conn.execute("UPDATE urls SET state = 'done', worker = ? WHERE url = ?",
+                         (self.worker_id, url))
+            if page_data is not None:
+                conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                             (slug, url, self.worker_id, json.dumps(page_data, ensure_ascii=False)))
+            conn.execute('UPDATE workers SET fetched = fetched + 1, last_seen = ? WHERE worker = ?',
+                         (time.time(), self.worker_id))
+        self.finished += 1
+
+    def done(self, url):
+        self.finish(url)
+
+    def skip(self, url):
+        """Drop a URL that will not be fetched (robots.txt) and refund its budget"""
+        with self._lock:
+            if self.active.pop(url, None) is None:
+                return
+            self.issued -= 1
+        self._execute("UPDATE urls SET state = 'skipped', issued = 0 WHERE url = ?", (url,))
+
+    def discard(self, url):
+        """Take url out of the shared crawl because it was fetched some other way.
+
+        Returns False if a worker already has it (or has fetched it)."""
+        with self._lock:
+            self.seen.add(url)
+        now = time.time()
+        with self._db_lock, self.conn:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            self._flush(conn)
+            row = conn.execute('SELECT state FROM urls WHERE url = ?', (url,)).fetchone()
+            if row is not None and row[0] != 'queued':
+                return False
+            # Leased to this worker until finish(), so if it dies first the
+            # URL goes back to the queue and is crawled as HTML
+            conn.execute("INSERT INTO urls (url, depth, priority, state, worker, lease_until) "
+                         "VALUES (?, 1, ?, 'leased', ?, ?) ON CONFLICT(url) DO UPDATE SET "
+                         "state = 'leased', worker = excluded.worker, "
+                         "lease_until = excluded.lease_until",
+                         (url, self.score(url, 1), self.worker_id, now + self.lease_seconds))
+        return True
+
+    def depth_of(self, url):
+        with self._lock:
+            entry = self.active.get(url)
+        return entry[1] if entry else 0
+
+    def renew(self):
+        """Extend the leases on every URL this worker holds"""
+        with self._lock:
+            held = list(self.active) + [url for url, _ in self._leased]
+        now = time.time()
+        with self._db_lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany("UPDATE urls SET lease_until = ? "
+                                  "WHERE url = ? AND state = 'leased' AND worker = ?",
+                                  [(now + self.lease_seconds, url, self.worker_id) for url in held])
+            self.conn.execute('UPDATE workers SET last_seen = ? WHERE worker = ?',
+                              (now, self.worker_id))
+
+    def start_heartbeat(self):
+        """Renew this worker's leases in the background until close()"""
+        def beat():
+            while not self._stopped.wait(self.lease_seconds / 3):
+                try:
+                    self.renew()
+                except sqlite3.Error as e:
+                    print(f"Could not renew leases: {str(e)}")
+        self._heartbeat = threading.Thread(target=beat, name='lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def close(self):
+        """Stop renewing and hand back every URL this worker still holds"""
+        self._stopped.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+        with self._lock:
+            held = list(self.active) + [url for url, _ in self._leased]
+            self.active.clear()
+            self._leased = []
+        with self._db_lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self._flush(self.conn)
+            self.conn.executemany("UPDATE urls SET state = 'queued', attempts = attempts - 1, "
+                                  "worker = NULL WHERE url = ? AND state = 'leased' AND worker = ?",
+                                  [(url, self.worker_id) for url in held])
+        self.conn.close()
+
+    def _counts(self):
+        with self._db_lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self._flush(self.conn)
+            budget_left = 1
+            if self.max_pages is not None:
+                issued = self.conn.execute('SELECT COUNT(*) FROM urls WHERE issued = 1').fetchone()[0]
+                budget_left = int(issued < self.max_pages)
+            available, leased = self.conn.execute(
+                "SELECT COALESCE(SUM(state = 'queued' AND (issued = 1 OR ?)), 0), "
+                "COALESCE(SUM(state = 'leased'), 0) FROM urls", (budget_left,)).fetchone()
+            # The worker reading the sitemaps is still at it (and still alive)
+            seeding = self.conn.execute(
+                "SELECT COUNT(*) FROM crawl JOIN workers ON workers.worker = crawl.value "
+                "WHERE crawl.key = 'sitemaps' AND workers.last_seen > ? "
+                "AND NOT EXISTS (SELECT 1 FROM crawl WHERE key = 'seeded')",
+                (time.time() - self.lease_seconds,)).fetchone()[0]
+            return available, leased, seeding
+
+    def __len__(self):
+        return self._counts()[0]
+
+    def __bool__(self):
+        with self._lock:
+            if self._leased:
+                return True
+        return any(self._counts())
+
+    def summary(self):
+        with self._db_lock:
+            counts, pages, workers = crawl_status(self.conn)
+        parts = [f"Shared frontier: this worker fetched {self.finished} URLs; all "
+                 f"{len(workers)} workers: {counts['done']} done, {pages} pages, "
+                 f"{counts['queued']} left in the queue"]
+        if counts['failed']:
+            parts.append(f"{counts['failed']} abandoned after {self.max_attempts} lost leases")
+        if self.max_depth is not None:
+            parts.append(f"{self.too_deep} links beyond depth {self.max_depth} skipped here")
+        if self.max_pages is not None and counts['queued'] and not len(self):
+            parts.append(f"stopped at the {self.max_pages}-page budget")
+        return ', '.join(parts)
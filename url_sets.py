@@ -0,0 +1,162 @@
+import hashlib
+import heapq
+import math
+import sys
+from array import array
+from bisect import bisect_left
+
+# Visited-URL sets for the crawl frontier. A plain set of URL strings costs
+# well over 100 bytes per URL; on a crawl of millions of URLs that is most of
+# the scraper's memory. Two compact alternatives trade a little certainty:
+#
+#   hashed - a sorted array of 64-bit URL hashes (~8-16 bytes/URL). Two URLs
+#            only collide with odds of about n^2 / 2^65, one in ten million
+#            at a million URLs.
+#   bloom  - a scalable Bloom filter (~3-5 bytes/URL at 0.1%). A false positive
+#            makes the crawler skip a page it never saw, at most error_rate of
+#            the time; it grows as the crawl does, so no size is needed up front.
+
+VISITED_SET_KINDS = ('exact', 'hashed', 'bloom')
+
+def url_hash(url, digest_size=8):
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=digest_size).digest(),
+                          'little')
+
+class ExactUrlSet(set):
+    """The plain set of URL strings, with a memory estimate"""
+    def nbytes(self):
+        return sys.getsizeof(self) + sum(sys.getsizeof(url) for url in self)
+
+class HashedUrlSet:
+    """Set of 64-bit URL hashes: a sorted array plus a small set of recent additions"""
+    MIN_MERGE = 16384
+
+    def __init__(self, urls=()):
+        self._sorted = array('Q')
+        self._recent = set()
+        self.update(urls)
+
+    def _in_sorted(self, key):
+        index = bisect_left(self._sorted, key)
+        return index < len(self._sorted) and self._sorted[index] == key
+
+    def add(self, url):
+        key = url_hash(url)
+        if key in self._recent or self._in_sorted(key):
+            return
+        self._recent.add(key)
+        # Merging when the recent set reaches 1/8 of the array keeps the
+        # total merge work linear and the Python-int overhead small
+        if len(self._recent) >= max(self.MIN_MERGE, len(self._sorted) // 8):
+            self._merge()
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def _merge(self):
+        self._sorted = array('Q', heapq.merge(self._sorted, sorted(self._recent)))
+        self._recent = set()
+
+    def __contains__(self, url):
+        key = url_hash(url)
+        return key in self._recent or self._in_sorted(key)
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def nbytes(self):
+        return (sys.getsizeof(self._sorted) + sys.getsizeof(self._recent) +
+                sum(sys.getsizeof(key) for key in self._recent))
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for capacity items at error_rate"""
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, first, second):
+        # Double hashing: k bit positions from the two 64-bit halves of one digest
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            yield (first + i * second) % num_bits
+
+    def contains_key(self, first, second):
+        bits = self.bits
+        for position in self._positions(first, second):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add_key(self, first, second):
+        bits = self.bits
+        for position in self._positions(first, second):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+class ScalableBloomFilter:
+    """Bloom filter that adds bigger, stricter slices as it fills.
+
+    Slice i is built for error_rate * (1 - ratio) * ratio**i, so the
+    overall false-positive rate stays under error_rate however many slices
+    there are (Almeida et al., "Scalable Bloom Filters")."""
+    def __init__(self, error_rate=0.001, initial_capacity=65536, growth=2, ratio=0.5, urls=()):
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate must be between 0 and 1, got {error_rate}")
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.growth = growth
+        self.ratio = ratio
+        self.filters = []
+        self.update(urls)
+
+    def _key(self, url):
+        key = url_hash(url, digest_size=16)
+        return key & 0xFFFFFFFFFFFFFFFF, (key >> 64) | 1
+
+    def add(self, url):
+        key = self._key(url)
+        if any(bloom.contains_key(*key) for bloom in self.filters):
+            return
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            index = len(self.filters)
+            self.filters.append(BloomFilter(
+                self.initial_capacity * self.growth ** index,
+                self.error_rate * (1 - self.ratio) * self.ratio ** index))
+        self.filters[-1].add_key(*key)
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def __contains__(self, url):
+        key = self._key(url)
+        return any(bloom.contains_key(*key) for bloom in self.filters)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def nbytes(self):
+        return sum(sys.getsizeof(bloom.bits) for bloom in self.filters)
+
+def make_visited_set(kind='exact', error_rate=0.001):
+    """Build an empty visited-URL set of the given kind"""
+    if kind == 'exact':
+        return ExactUrlSet()
+    if kind == 'hashed':
+        return HashedUrlSet()
+    if kind == 'bloom':
+        return ScalableBloomFilter(error_rate=error_rate)
+    raise ValueError(f"Unknown visited set {kind!r}, expected one of {VISITED_SET_KINDS}")
+
+def describe_memory(urls):
+    """One-line memory report for a visited-URL set"""
+    count = len(urls)
+    nbytes = urls.nbytes()
+    per_url = nbytes / count if count else 0.0
+    return (f"Visited set ({type(urls).__name__}): {count} URLs in "
+            f"{nbytes / 1024 / 1024:.2f} MB, {per_url:.1f} bytes/URL")
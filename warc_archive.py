@@ -0,0 +1,144 @@
+import base64
+import gzip
+import hashlib
+import os
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+# Raw response archive for scraper.py in the WARC 1.0 format (ISO 28500), so
+# standard tools (warcio, pywb, ...) can read it too. Every record is its
+# own gzip member appended to the file: a crashed crawl leaves every
+# complete record readable, and later crawls can keep appending.
+#
+#   warcinfo   written once at the top of a new file, with the crawl's base URL
+#   response   "HTTP/1.1 200 OK", the headers, a blank line, then the body
+#
+# requests hands us bodies already decoded, so Content-Encoding and
+# Transfer-Encoding are kept as X-Archive-Orig-* headers and Content-Length
+# is rewritten to match the stored body.
+
+REWRITTEN_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+def _warc_date():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _payload_digest(body):
+    return 'sha1:' + base64.b32encode(hashlib.sha1(body).digest()).decode('ascii')
+
+class WarcWriter:
+    """Append-only, thread-safe writer of gzipped WARC records"""
+    def __init__(self, path, base_url=None):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self.count = 0
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'ab')
+        if new_file:
+            fields = [('software', 'Mastiff scraper.py'),
+                      ('format', 'WARC File Format 1.0')]
+            if base_url:
+                fields.append(('base-url', base_url))
+            payload = ''.join(f"{name}: {value}\r\n" for name, value in fields).encode('utf-8')
+            self._write_record('warcinfo', None, 'application/warc-fields', payload)
+
+    def _write_record(self, warc_type, url, content_type, block, extra=()):
+        headers = [('WARC-Type', warc_type),
+                   ('WARC-Record-ID', f"<urn:uuid:{uuid.uuid4()}>"),
+                   ('WARC-Date', _warc_date())]
+        if url:
+            headers.append(('WARC-Target-URI', url))
+        headers.extend(extra)
+        headers.append(('Content-Type', content_type))
+        headers.append(('Content-Length', str(len(block))))
+        record = (b'WARC/1.0\r\n' +
+                  ''.join(f"{name}: {value}\r\n" for name, value in headers).encode('utf-8') +
+                  b'\r\n' + block + b'\r\n\r\n')
+        # Compress outside the lock; only the append needs to be serialised
+        member = gzip.compress(record)
+        with self._lock:
+            self.file.write(member)
+            self.file.flush()
+            if warc_type == 'response':
+                self.count += 1
+
+    def write_response(self, url, status_code, reason, headers, body, http_version='HTTP/1.1'):
+        """Archive one HTTP response (headers as a dict, body as decoded bytes)"""
+        lines = [f"{http_version} {status_code} {reason or ''}".rstrip()]
+        for name, value in headers.items():
+            if name.lower() in REWRITTEN_HEADERS:
+                if name.lower() != 'content-length':
+                    lines.append(f"X-Archive-Orig-{name}: {value}")
+                continue
+            lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body)}")
+        block = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace') + body
+        self._write_record('response', url, 'application/http; msgtype=response', block,
+                           extra=[('WARC-Payload-Digest', _payload_digest(body))])
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+
+def _read_fields(stream):
+    """Read 'Name: value' lines up to a blank line; None at end of file"""
+    fields = {}
+    line = stream.readline()
+    while line in (b'\r\n', b'\n'):  # padding between records
+        line = stream.readline()
+    if not line:
+        return None
+    version = line.strip()
+    while True:
+        line = stream.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('utf-8', 'replace').partition(':')
+        fields[name.strip().lower()] = value.strip()
+    return version, fields
+
+def iter_records(path):
+    """Yield (warc_type, fields, block) for every record; a torn final record is skipped"""
+    with gzip.open(path, 'rb') as stream:
+        while True:
+            try:
+                header = _read_fields(stream)
+                if header is None:
+                    return
+                _, fields = header
+                length = int(fields.get('content-length', 0))
+                block = stream.read(length)
+            except (EOFError, OSError, zlib.error, ValueError):
+                return
+            if len(block) < length:
+                return
+            yield fields.get('warc-type'), fields, block
+
+def parse_http_response(block):
+    """Split an archived HTTP response into (status_code, headers dict, body)"""
+    head, _, body = block.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status_code = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers.setdefault(name.strip(), value.strip())
+    return status_code, headers, body
+
+def read_base_url(path):
+    """The base URL recorded in the archive's warcinfo, or None"""
+    for warc_type, fields, block in iter_records(path):
+        if warc_type != 'warcinfo':
+            return None
+        for line in block.decode('utf-8', 'replace').splitlines():
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'base-url':
+                return value.strip()
+    return None
+
+def iter_responses(path):
+    """Yield (url, status_code, headers, body) for every archived response"""
+    for warc_type, fields, block in iter_records(path):
+        if warc_type == 'response':
+            yield (fields.get('warc-target-uri'),) + parse_http_response(block)
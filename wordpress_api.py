@@ -0,0 +1,154 @@
+import html
+import time
+from datetime import datetime
+from urllib.parse import urljoin
+
+import requests
+
+from html_backends import parse_html
+
+# Fast path for WordPress sites: instead of fetching and parsing every post
+# and page as HTML, read them in bulk from the REST API, 100 at a time:
+#
+#   /wp-json/wp/v2/pages?per_page=100&page=1    (X-WP-TotalPages says how many)
+#   /wp-json/wp/v2/posts?per_page=100&page=1
+#   /wp-json/wp/v2/media?per_page=100&page=1    alt text of featured images
+#
+# Sites without pretty permalinks only answer on /?rest_route=/wp/v2/...,
+# so that is tried second. Each item's rendered content is run through the
+# scraper's own extract_sections, wrapped the way themes wrap it, so the
+# pages come out in the same shape as crawled ones.
+
+API_COLLECTIONS = ('pages', 'posts')
+PER_PAGE = 100
+ITEM_FIELDS = 'id,link,title,content,excerpt,featured_media,modified_gmt'
+MEDIA_FIELDS = 'id,source_url,alt_text,title'
+
+class WordPressAPI:
+    """Paginated reads from a WordPress site's /wp/v2 REST endpoints"""
+    def __init__(self, base_url, session, throttle, metrics=None, timeout=15):
+        self.base_url = base_url
+        self.session = session
+        self.throttle = throttle
+        self.metrics = metrics
+        self.timeout = timeout
+        # (url, params) builders for the two ways WordPress exposes the API
+        self.roots = [lambda route: (urljoin(base_url, '/wp-json' + route), {}),
+                      lambda route: (urljoin(base_url, '/'), {'rest_route': route})]
+        self.requests = 0
+
+    def get(self, route, params):
+        """GET a REST route on whichever root works; returns the response or None"""
+        for index, root in enumerate(self.roots):
+            url, extra = root(route)
+            queued = time.perf_counter()
+            try:
+                with self.throttle.limit(url):
+                    # Timed from here, as in fetch(): the wait for the host's
+                    # slot must not read as server latency to the throttle
+                    started = time.perf_counter()
+                    response = self.session.get(url, params=dict(params, **extra),
+                                                timeout=self.timeout, stream=True)
+                    headers_at = time.perf_counter()
+                    body = response.content
+                    done = time.perf_counter()
+            except requests.RequestException as e:
+                print(f"WordPress API request failed: {str(e)}")
+                return None
+            timings = {'wait': started - queued, 'ttfb': headers_at - started,
+                       'download': done - headers_at}
+            self.requests += 1
+            self.throttle.feedback(url, response.status_code, timings['ttfb'])
+            if self.metrics:
+                self.metrics.record_fetch(response.url, response.status_code, len(body), timings)
+                self.metrics.finish(response.url)
+            is_json = 'json' in response.headers.get('Content-Type', '')
+            if response.status_code == 404 or not is_json:
+                continue
+            # Stick to the root that answered
+            self.roots = self.roots[index:index + 1]
+            return response
+        return None
+
+    def iter_collection(self, name, fields):
+        """Yield every item of a collection, 100 per request"""
+        page = 1
+        total_pages = 1
+        while page <= total_pages:
+            response = self.get(f"/wp/v2/{name}",
+                                {'per_page': PER_PAGE, 'page': page, '_fields': fields})
+            # A 400 past the last page, or a 401/403 where the API is locked down
+            if response is None or response.status_code != 200:
+                return
+            items = response.json()
+            if not isinstance(items, list) or not items:
+                return
+            yield from items
+            total_pages = int(response.headers.get('X-WP-TotalPages', page))
+            page += 1
+
+    def iter_site_pages(self, scraper, home_page):
+        """Yield (url, page_data, links found in it) for every published page and post"""
+        media = None
+        for name in API_COLLECTIONS:
+            for item in self.iter_collection(name, ITEM_FIELDS):
+                if not item.get('link'):
+                    continue
+                # Only worth listing the media library if something uses it
+                if media is None and item.get('featured_media'):
+                    media = self.media()
+                url, page_data, new_urls = page_from_item(scraper, item, media or {}, home_page)
+                if scraper.is_valid_url(url):
+                    yield url, page_data, new_urls
+
+    def media(self):
+        """Attachment id -> {'src', 'alt', 'title'}"""
+        return {item['id']: {'src': item.get('source_url', ''),
+                             'alt': item.get('alt_text', ''),
+                             'title': rendered_text(item.get('title'))}
+                for item in self.iter_collection('media', MEDIA_FIELDS)}
+
+def rendered(field):
+    """The HTML of a {'rendered': ...} field"""
+    if isinstance(field, dict):
+        return field.get('rendered') or ''
+    return field or ''
+
+def rendered_text(field, backend='lxml'):
+    """Plain text of a rendered field (titles and excerpts carry entities and tags)"""
+    markup = rendered(field)
+    if '<' not in markup:
+        return html.unescape(markup).strip()
+    return parse_html(markup, backend).get_text(' ', strip=True)
+
+def page_from_item(scraper, item, media, home_page):
+    """(url, page_data, new_urls) for a post or page, as parse_page would build them"""
+    url = scraper.normalize_url(item['link'])
+    title = rendered_text(item.get('title'), scraper.parser_backend)
+    # Themes put the title and content in one <article>, so the post becomes
+    # a section of its own and any blocks nested in it become more
+    markup = f"<article><h1>{html.escape(title)}</h1>{rendered(item.get('content'))}</article>"
+    soup = parse_html(markup, scraper.parser_backend)
+    sections = scraper.extract_sections(soup)
+
+    all_images = [{'src': urljoin(url, img.get('src', '')), 'alt': img.get('alt', ''),
+                   'title': img.get('title', '')}
+                  for img in soup.find_all('img') if img.get('src')]
+    featured = media.get(item.get('featured_media'))
+    if featured and featured['src']:
+        all_images.insert(0, dict(featured))
+        if sections:
+            sections[0]['images'].insert(0, dict(featured))
+
+    page_data = {
+        'url': url,
+        'title': title,
+        'meta_description': rendered_text(item.get('excerpt'), scraper.parser_backend),
+        'cms_info': home_page['cms_info'],
+        'sections': sections,
+        'all_images': all_images,
+        # Every page of a WordPress site shares the theme's header
+        'navigation_links': home_page['navigation_links'],
+        'scraped_at': datetime.now().isoformat()
+    }
+    return url, page_data, scraper.discover_urls(soup, url)